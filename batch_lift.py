@@ -0,0 +1,121 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+import numpy as np
+
+from common.camera import normalize_screen_coordinates
+from common.columnar import ColumnarStore
+from common.custom_dataset import CustomDataset
+from common.inference import Lifter
+from common.mocap_dataset import select_data
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Batch 3D pose lifting of the videos of a custom dataset')
+    parser.add_argument('videos', nargs='*', metavar='VIDEO',
+                        help='videos (subjects of the dataset) to lift (default: all)')
+    parser.add_argument('-d', '--dataset', type=str, metavar='NAME', required=True,
+                        help='custom dataset (custom_dataset/NAME.npz, or a columnar store with --columnar)')
+    parser.add_argument('--columnar', action='store_true', help='load the 2D detections from a columnar store')
+    parser.add_argument('-c', '--checkpoint', default='checkpoint', type=str, metavar='PATH', help='checkpoint directory')
+    parser.add_argument('--evaluate', default='pretrained_h36m_detectron_coco.bin', type=str, metavar='FILENAME',
+                        help='checkpoint to use (file name)')
+    parser.add_argument('-arc', '--architecture', default='3,3,3,3,3', type=str, metavar='LAYERS',
+                        help='filter widths separated by comma')
+    parser.add_argument('--causal', action='store_true', help='use causal convolutions')
+    parser.add_argument('-ch', '--channels', default=1024, type=int, metavar='N', help='number of channels in convolution layers')
+    parser.add_argument('--dense', action='store_true', help='use dense convolutions instead of dilated convolutions')
+    parser.add_argument('-no-tta', '--no-test-time-augmentation', dest='test_time_augmentation', action='store_false',
+                        help='disable test-time flipping')
+    parser.add_argument('-o', '--output', default='results3d', type=str, metavar='PATH',
+                        help='output directory, relative to this script (one VIDEO.npy file per video)')
+    parser.add_argument('--group-size', default=32, type=int, metavar='N',
+                        help='number of videos predicted together (their exports overlap with the next group)')
+    parser.add_argument('--workers', default=4, type=int, metavar='N',
+                        help='number of threads that prepare the inputs and write the exports')
+    parser.add_argument('--packed-frames', default=8192, type=int, metavar='N', help='input frames per row for packed inference')
+    parser.add_argument('--packed-batch', default=8, type=int, metavar='N', help='rows per batch for packed inference')
+    parser.set_defaults(test_time_augmentation=True)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    start_time = time()
+
+    # Load the dataset index (only the requested videos are read)
+    keypoints_path = os.path.join('custom_dataset', args.dataset + ('' if args.columnar else '.npz'))
+    subjects = args.videos or None
+    dataset = CustomDataset(keypoints_path, subjects=subjects)
+    if args.columnar:
+        store = ColumnarStore(keypoints_path)
+        keypoints_metadata = store.metadata
+        keypoints = store.load('positions_2d', subjects)
+        keypoints_normalized = keypoints_metadata.get('normalized', False)
+    else:
+        keypoints = np.load(keypoints_path, allow_pickle=True)
+        keypoints_metadata = keypoints['metadata'].item()
+        keypoints = select_data(keypoints['positions_2d'].item(), subjects)
+        keypoints_normalized = False
+    videos = list(dataset.subjects())
+    if len(videos) == 0:
+        print('No videos to lift')
+        return
+    for video in args.videos:
+        assert video in keypoints, 'Video {} is missing from the 2D detections dataset'.format(video)
+
+    keypoints_symmetry = keypoints_metadata['keypoints_symmetry']
+    lifter = Lifter.from_checkpoint(os.path.join(args.checkpoint, args.evaluate),
+                                    keypoints[videos[0]]['custom'][0].shape[-2],
+                                    keypoints[videos[0]]['custom'][0].shape[-1],
+                                    dataset.skeleton().num_joints(),
+                                    filter_widths=[int(x) for x in args.architecture.split(',')],
+                                    causal=args.causal, channels=args.channels, dense=args.dense,
+                                    augment=args.test_time_augmentation,
+                                    kps_left=list(keypoints_symmetry[0]), kps_right=list(keypoints_symmetry[1]),
+                                    joints_left=list(dataset.skeleton().joints_left()),
+                                    joints_right=list(dataset.skeleton().joints_right()),
+                                    max_frames=args.packed_frames, batch_size=args.packed_batch)
+    print('INFO: model and {} videos loaded in {:.2f} s'.format(len(videos), time() - start_time))
+
+    def prepare(video):
+        kps = keypoints[video]['custom'][0]
+        if keypoints_normalized:
+            return kps
+        cam = dataset.cameras()[video][0]
+        kps = np.array(kps) # Copy (the arrays can be read-only views on a columnar store)
+        kps[..., :2] = normalize_screen_coordinates(kps[..., :2], w=cam['res_w'], h=cam['res_h'])
+        return kps
+
+    output_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), args.output)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Predictions are in camera space, as with --viz-export
+    def export(video, prediction):
+        np.save(os.path.join(output_dir, video), prediction)
+
+    num_frames = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        exports = []
+        for start in range(0, len(videos), args.group_size):
+            group = videos[start : start + args.group_size]
+            predictions = lifter.predict(list(executor.map(prepare, group)))
+            for video, prediction in zip(group, predictions):
+                exports.append(executor.submit(export, video, prediction))
+                num_frames += prediction.shape[0]
+            print('Lifted {}/{} videos'.format(start + len(group), len(videos)))
+        for future in exports:
+            future.result() # Propagate export errors
+    elapsed = time() - start_time
+    print('INFO: {} videos, {} frames in {:.2f} s ({:.1f} FPS), exported to {}'.format(
+        len(videos), num_frames, elapsed, num_frames / elapsed, output_dir))
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,10 @@ def parse_args():
     parser.add_argument('--evaluate', default='', type=str, metavar='FILENAME', help='checkpoint to evaluate (file name)')
     parser.add_argument('--render', action='store_true', help='visualize a particular video')
     parser.add_argument('--by-subject', action='store_true', help='break down error by subject (on evaluation)')
+    parser.add_argument('--columnar', action='store_true',
+                        help='load the datasets from memory-mapped columnar stores instead of .npz archives')
+    parser.add_argument('--data-cache', default='', type=str, metavar='PATH',
+                        help='cache the prepared 3D poses and normalized 2D keypoints in this directory')
     parser.add_argument('--export-training-curves', action='store_true', help='save training curves as .png images')
 
     # Model arguments
@@ -57,6 +61,49 @@ def parse_args():
     parser.add_argument('--no-bone-length', action='store_false', dest='bone_length_term',
                         help='disable bone length term in semi-supervised settings')
     parser.add_argument('--no-proj', action='store_true', help='disable projection for semi-supervised setting')
+    parser.add_argument('--distributed', action='store_true',
+                        help='data-parallel training with one process per rank (launch with torchrun)')
+    parser.add_argument('--dist-backend', default='gloo', type=str, metavar='NAME', help='torch.distributed backend')
+    parser.add_argument('--shuffle-block', default=0, type=int, metavar='N',
+                        help='shuffle blocks of N contiguous training chunks instead of single chunks (0 = disabled)')
+    parser.add_argument('--shuffle-buffer', default=4096, type=int, metavar='N',
+                        help='with --shuffle-block, shuffle the chunks within windows of N chunks')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='read the training batches from the memory-mapped sequences instead of copying them in memory')
+    parser.add_argument('--prefetch', default=0, type=int, metavar='N',
+                        help='assemble up to N training batches in advance, in background threads (0 = disabled)')
+    parser.add_argument('--prefetch-workers', default=1, type=int, metavar='N', help='number of threads used for prefetching')
+    parser.add_argument('--precision', default='fp32', type=str, metavar='NAME',
+                        help='mixed precision for training and evaluation (fp32, bf16 or fp16)')
+    
+    # Distillation
+    parser.add_argument('--teacher', default='', type=str, metavar='FILENAME',
+                        help='train on the predictions of this checkpoint (file name) instead of the ground truth')
+    parser.add_argument('--teacher-architecture', default='3,3,3,3,3', type=str, metavar='LAYERS', help='filter widths of the teacher')
+    parser.add_argument('--teacher-channels', default=1024, type=int, metavar='N', help='number of channels of the teacher')
+    parser.add_argument('--teacher-causal', action='store_true', help='the teacher uses causal convolutions')
+    
+    # Inference
+    parser.add_argument('--fuse-bn', action='store_true', help='fold batch normalization into convolutions (evaluation only)')
+    parser.add_argument('--window-size', default=0, type=int, metavar='N',
+                        help='evaluate long sequences in tiles of N output frames (0 = whole sequence)')
+    parser.add_argument('--window-workers', default=1, type=int, metavar='N', help='number of tiles evaluated concurrently')
+    parser.add_argument('--export-model', type=str, metavar='PREFIX', help='export the evaluated model(s) to PREFIX_pos/PREFIX_traj')
+    parser.add_argument('--export-format', default='torchscript', type=str, metavar='NAME', help='export format (torchscript or onnx)')
+    parser.add_argument('--exported-model', type=str, metavar='PREFIX', help='evaluate exported model(s) instead of the eager modules')
+    parser.add_argument('--quantize', action='store_true', help='compare the model with its int8 quantized version (CPU)')
+    parser.add_argument('--quant-calibration', type=str, metavar='PATH',
+                        help='custom dataset (.npz) used to calibrate the quantized model (default: test set)')
+    parser.add_argument('--quant-calibration-frames', default=10000, type=int, metavar='N', help='number of calibration frames')
+    parser.add_argument('--quant-backend', default='fbgemm', type=str, metavar='NAME', help='quantized engine (fbgemm or qnnpack)')
+    parser.add_argument('--eval-batch', default=0, type=int, metavar='N',
+                        help='evaluate N sequences of similar length at once (0 = one sequence at a time)')
+    parser.add_argument('--export-predictions', type=str, metavar='PATH',
+                        help='predict all the test sequences and save them to a NumPy archive')
+    parser.add_argument('--packed-frames', default=8192, type=int, metavar='N', help='input frames per row for packed inference')
+    parser.add_argument('--packed-batch', default=8, type=int, metavar='N', help='rows per batch for packed inference')
+    parser.add_argument('--keyframe-step', default=1, type=int, metavar='N',
+                        help='only predict every N-th frame when exporting predictions (sparse inference)')
     
     # Visualization
     parser.add_argument('--viz-subject', type=str, metavar='STR', help='subject to render')
@@ -82,6 +129,42 @@ def parse_args():
         print('Invalid flags: --resume and --evaluate cannot be set at the same time')
         exit()
         
+    if args.teacher and args.evaluate:
+        print('Invalid flags: --teacher and --evaluate cannot be set at the same time')
+        exit()
+        
+    if args.fuse_bn and not args.evaluate:
+        print('Invalid flags: --fuse-bn can only be used with --evaluate')
+        exit()
+        
+    if args.export_predictions and not args.evaluate:
+        print('Invalid flags: --export-predictions can only be used with --evaluate')
+        exit()
+        
+    if args.keyframe_step > 1 and not args.export_predictions:
+        print('Invalid flags: --keyframe-step requires --export-predictions')
+        exit()
+        
+    if args.quantize and not args.evaluate:
+        print('Invalid flags: --quantize can only be used with --evaluate')
+        exit()
+        
+    if (args.export_model or args.exported_model) and not args.evaluate:
+        print('Invalid flags: --export-model and --exported-model can only be used with --evaluate')
+        exit()
+        
+    if args.distributed and args.evaluate:
+        print('Invalid flags: --distributed and --evaluate cannot be set at the same time')
+        exit()
+        
+    if args.precision not in ('fp32', 'bf16', 'fp16'):
+        print('Invalid flags: --precision must be fp32, bf16 or fp16')
+        exit()
+        
+    if args.out_of_core and not (args.columnar or args.data_cache):
+        print('Invalid flags: --out-of-core requires memory-mapped data (--columnar or --data-cache)')
+        exit()
+        
     if args.export_training_curves and args.no_eval:
         print('Invalid flags: --export-training-curves and --no-eval cannot be set at the same time')
         exit()
@@ -6,10 +6,8 @@
 #
 
 import numpy as np
-import torch
 
-from common.utils import wrap
-from common.quaternion import qrot, qinverse
+from common.utils import is_tensor
 
 def normalize_screen_coordinates(X, w, h): 
     assert X.shape[-1] == 2
@@ -25,13 +23,39 @@ def image_coordinates(X, w, h):
     return (X + [1, h/w])*w/2
     
 
+def quaternion_to_matrix(q):
+    """
+    Convert a normalized quaternion (w, x, y, z) to the 3x3 matrix M of the same rotation,
+    i.e. such that qrot(q, v) == M @ v. Works with NumPy arrays and PyTorch tensors of shape (4,).
+    """
+    assert q.shape == (4,)
+    w, x, y, z = q
+    rows = [
+        [1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y)],
+        [2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x)],
+        [2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y)],
+    ]
+    if is_tensor(q):
+        import torch
+        return torch.stack([torch.stack(row) for row in rows])
+    return np.array(rows, dtype=q.dtype)
+
+
+def _rotation_matrix(R, X):
+    # Rotation matrix of the quaternion R, with the type, dtype (and device) of the points X
+    if is_tensor(X):
+        import torch
+        return quaternion_to_matrix(torch.as_tensor(R, dtype=X.dtype, device=X.device))
+    return quaternion_to_matrix(np.asarray(R, dtype=X.dtype))
+
+
 def world_to_camera(X, R, t):
-    Rt = wrap(qinverse, R) # Invert rotation
-    return wrap(qrot, np.tile(Rt, (*X.shape[:-1], 1)), X - t) # Rotate and translate
+    # Rotate by the inverse of R (i.e. the transposed matrix), using row vectors
+    return (X - t) @ _rotation_matrix(R, X)
 
     
 def camera_to_world(X, R, t):
-    return wrap(qrot, np.tile(R, (*X.shape[:-1], 1)), X) + t
+    return X @ _rotation_matrix(R, X).T + t
 
     
 def project_to_2d(X, camera_params):
@@ -43,6 +67,7 @@ def project_to_2d(X, camera_params):
     X -- 3D points in *camera space* to transform (N, *, 3)
     camera_params -- intrinsic parameteres (N, 2+2+3+2=9)
     """
+    import torch
     assert X.shape[-1] == 3
     assert len(camera_params.shape) == 2
     assert camera_params.shape[-1] == 9
@@ -74,6 +99,7 @@ def project_to_2d_linear(X, camera_params):
     X -- 3D points in *camera space* to transform (N, *, 3)
     camera_params -- intrinsic parameteres (N, 2+2+3+2=9)
     """
+    import torch
     assert X.shape[-1] == 3
     assert len(camera_params.shape) == 2
     assert camera_params.shape[-1] == 9
@@ -0,0 +1,162 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+INDEX_FILE = 'index.json'
+
+def _to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+def _sequences(data):
+    """
+    Iterate over the (subject, action, camera, array) sequences of a nested dataset dictionary.
+    The camera is None for the sequences that are not split by camera (e.g. 3D positions in world space).
+    """
+    for subject, actions in data.items():
+        for action, sequences in actions.items():
+            if isinstance(sequences, (list, tuple)):
+                for cam_idx, seq in enumerate(sequences):
+                    if seq is not None: # Missing cameras are kept as None when loading
+                        yield subject, action, cam_idx, seq
+            else:
+                yield subject, action, None, sequences
+
+def write_store(path, modalities, metadata=None):
+    """
+    Save a dataset to a columnar store, i.e. a directory that contains one .npy file per modality,
+    in which the frames of all the sequences are concatenated (float32), and an index that maps
+    each (subject, action, camera) key to a range of frames.
+
+    Arguments:
+    path -- output directory
+    modalities -- dictionary modality name -> nested dictionary (subject -> action -> array, or list of
+                  arrays with one element per camera), as in the .npz archives of this project
+    metadata -- JSON-serializable dictionary saved along with the index (optional)
+
+    The store is written to a temporary directory next to path, which is then renamed, so that
+    an interrupted write never leaves an incomplete store behind. An existing store is replaced.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = os.path.join(parent, '.{}.{}.tmp'.format(os.path.basename(path), uuid.uuid4().hex))
+    os.makedirs(tmp_path)
+    try:
+        _write_store(tmp_path, modalities, metadata)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+            # Replace the existing directory (e.g. the same store, written concurrently by another process)
+            old_path = tmp_path + '.old'
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+def _write_store(path, modalities, metadata):
+    index = {'metadata': {} if metadata is None else metadata, 'modalities': {}}
+    for name, data in modalities.items():
+        entries = []
+        frames = 0
+        frame_shape = None
+        for subject, action, camera, seq in _sequences(data):
+            assert frame_shape is None or seq.shape[1:] == frame_shape, 'Inconsistent frame shapes in ' + name
+            frame_shape = seq.shape[1:]
+            entries.append([subject, action, camera, frames, seq.shape[0]])
+            frames += seq.shape[0]
+
+        # Write the sequences one at a time, so that the dataset is never duplicated in memory
+        array = np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+',
+                                          dtype=np.float32, shape=(frames,) + tuple(frame_shape or ()))
+        for (_, _, _, start, length), (_, _, _, seq) in zip(entries, _sequences(data)):
+            array[start : start + length] = seq
+        array.flush()
+        del array
+        index['modalities'][name] = entries
+
+    with open(os.path.join(path, INDEX_FILE), 'w') as f:
+        json.dump(index, f, default=_to_json)
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+class ColumnarStore:
+    """
+    Read-only access to a columnar store (see write_store). The arrays are memory-mapped,
+    so opening a store does not depend on the size of the dataset, and the sequences are
+    returned as views on the mapped arrays (the frames are only read when they are accessed).
+
+    Arguments:
+    path -- directory of the store
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.metadata = index['metadata']
+        self._index = {}
+        for name, entries in index['modalities'].items():
+            self._index[name] = {(subject, action, camera): (start, length)
+                                 for subject, action, camera, start, length in entries}
+        self._arrays = {}
+
+    def modalities(self):
+        return list(self._index.keys())
+
+    def array(self, modality):
+        """
+        Return the memory-mapped array that contains all the frames of a modality.
+        """
+        if modality not in self._arrays:
+            self._arrays[modality] = np.load(os.path.join(self.path, modality + '.npy'), mmap_mode='r')
+        return self._arrays[modality]
+
+    def keys(self, modality):
+        return list(self._index[modality].keys())
+
+    def get(self, modality, subject, action, camera=None):
+        start, length = self._index[modality][(subject, action, camera)]
+        return self.array(modality)[start : start + length]
+
+    def load(self, modality, subjects=None, actions=None):
+        """
+        Return a modality as a nested dictionary (subject -> action -> array, or list of arrays with
+        one element per camera), in the same layout as the .npz archives. The arrays are read-only views.
+
+        Arguments:
+        modality -- name of the modality (e.g. 'positions_2d' or 'positions_3d')
+        subjects -- only load these subjects (default: all)
+        actions -- only load the actions starting with one of these names (default: all)
+        """
+        data = {}
+        for subject, action, camera in self._index[modality].keys():
+            if subjects is not None and subject not in subjects:
+                continue
+            if actions is not None and not any(action.startswith(a) for a in actions):
+                continue
+            subject_data = data.setdefault(subject, {})
+            seq = self.get(modality, subject, action, camera)
+            if camera is None:
+                subject_data[action] = seq
+            else:
+                cameras = subject_data.setdefault(action, [])
+                cameras.extend([None] * (camera + 1 - len(cameras)))
+                cameras[camera] = seq
+        return data
@@ -10,7 +10,8 @@ import copy
 from common.skeleton import Skeleton
 from common.mocap_dataset import MocapDataset
 from common.camera import normalize_screen_coordinates, image_coordinates
-from common.h36m_dataset import h36m_skeleton
+from common.h36m_skeleton import h36m_skeleton, h36m_static_joints
+from common.columnar import ColumnarStore, is_store
        
 
 custom_camera_params = {
@@ -25,16 +26,21 @@ custom_camera_params = {
 }
 
 class CustomDataset(MocapDataset):
-    def __init__(self, detections_path, remove_static_joints=True):
-        super().__init__(fps=None, skeleton=h36m_skeleton)        
+    def __init__(self, detections_path, remove_static_joints=True, subjects=None):
+        super().__init__(fps=None, skeleton=copy.deepcopy(h36m_skeleton))        
         
-        # Load serialized dataset
-        data = np.load(detections_path, allow_pickle=True)
-        resolutions = data['metadata'].item()['video_metadata']
+        # Load serialized dataset (.npz archive or columnar store)
+        if is_store(detections_path):
+            resolutions = ColumnarStore(detections_path).metadata['video_metadata']
+        else:
+            data = np.load(detections_path, allow_pickle=True)
+            resolutions = data['metadata'].item()['video_metadata']
         
         self._cameras = {}
         self._data = {}
         for video_name, res in resolutions.items():
+            if subjects is not None and video_name not in subjects:
+                continue # Only keep the requested videos
             cam = {}
             cam.update(custom_camera_params)
             cam['orientation'] = np.array(cam['orientation'], dtype='float32')
@@ -55,7 +61,7 @@ class CustomDataset(MocapDataset):
                 
         if remove_static_joints:
             # Bring the skeleton to 17 joints instead of the original 32
-            self.remove_joints([4, 5, 9, 10, 11, 16, 20, 21, 22, 23, 24, 28, 29, 30, 31])
+            self.remove_joints(h36m_static_joints)
             
             # Rewire shoulders to the correct parents
             self._skeleton._parents[11] = 8
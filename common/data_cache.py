@@ -0,0 +1,113 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+from common.columnar import ColumnarStore, write_store
+
+# Increase this number whenever the data preparation in run.py changes, to invalidate existing caches
+CACHE_VERSION = 3
+
+def _to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+def _file_digest(path, digests):
+    # The digest of a file is only computed again if its size or modification time changed
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    entry = digests.get(key)
+    if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digests[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return digests[key][2]
+
+def _update_digest(digest, path, digests):
+    if os.path.isdir(path):
+        # Columnar store
+        for name in sorted(os.listdir(path)):
+            digest.update(name.encode())
+            _update_digest(digest, os.path.join(path, name), digests)
+    else:
+        digest.update(_file_digest(path, digests).encode())
+
+def _load_digests(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {} # Missing or corrupted (the digests are then computed again)
+
+def _save_digests(path, digests):
+    # Write to a temporary file which is then renamed, so that concurrent readers never see a partial file
+    tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(digests, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def prepared_data_key(source_paths, cameras, selection=None, digests_path=None):
+    """
+    Return the cache key of the prepared data, i.e. a hash of the content of the source datasets
+    (.npz archives or columnar stores), of the camera parameters and of the selection of the
+    loaded subjects/actions (any JSON-serializable object, None if everything is loaded).
+    If digests_path is given, the digests of the source files are saved to this JSON file,
+    keyed by (path, size, modification time), so that unchanged files are not read again.
+    """
+    digests = {} if digests_path is None else _load_digests(digests_path)
+    old_digests = dict(digests)
+    digest = hashlib.sha256()
+    digest.update(str(CACHE_VERSION).encode())
+    for path in source_paths:
+        _update_digest(digest, path, digests)
+    digest.update(json.dumps(cameras, default=_to_json, sort_keys=True).encode())
+    digest.update(json.dumps(selection, sort_keys=True).encode())
+    if digests_path is not None and digests != old_digests:
+        _save_digests(digests_path, digests)
+    return digest.hexdigest()[:16]
+
+def save_prepared_data(path, dataset, keypoints, keypoints_metadata):
+    """
+    Save the camera-space 3D poses of a dataset and the normalized 2D keypoints to a columnar store.
+    """
+    positions_3d = {}
+    for subject in dataset.subjects():
+        for action, anim in dataset[subject].items():
+            if 'positions_3d' in anim:
+                positions_3d.setdefault(subject, {})[action] = anim['positions_3d']
+    modalities = {'positions_2d': keypoints}
+    if len(positions_3d) > 0:
+        modalities['positions_3d'] = positions_3d
+    write_store(path, modalities, metadata={'keypoints_metadata': keypoints_metadata})
+
+def load_prepared_data(path, dataset):
+    """
+    Load the data saved by save_prepared_data(): the 3D poses are added to the dataset (memory-mapped),
+    which can be loaded with load_positions=False, and the tuple (keypoints_metadata, keypoints) is returned.
+    """
+    store = ColumnarStore(path)
+    if 'positions_3d' in store.modalities():
+        for subject, actions in store.load('positions_3d').items():
+            for action, positions_3d in actions.items():
+                dataset.add_action(subject, action)['positions_3d'] = positions_3d
+    return store.metadata['keypoints_metadata'], store.load('positions_2d')
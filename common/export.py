@@ -0,0 +1,121 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import json
+import os
+
+import numpy as np
+import torch
+
+def model_metadata(model):
+    """
+    Return the metadata that is needed to feed a temporal model (padding of the input sequences).
+    """
+    return {
+        'receptive_field': model.receptive_field(),
+        'total_causal_shift': model.total_causal_shift(),
+        'num_joints_in': model.num_joints_in,
+        'in_features': model.in_features,
+        'num_joints_out': model.num_joints_out,
+    }
+
+def export_model(model, path, export_format='torchscript'):
+    """
+    Export a temporal model to TorchScript (.pt) or ONNX (.onnx), with a dynamic batch and time axis.
+    The receptive field and causal shift are embedded in the artifact.
+
+    Arguments:
+    model -- the model to export (it is set to evaluation mode)
+    path -- output file name
+    export_format -- 'torchscript' or 'onnx'
+    """
+    model.eval()
+    metadata = model_metadata(model)
+    device = next(model.parameters()).device
+    example_input = torch.randn(1, metadata['receptive_field'] + 16, metadata['num_joints_in'],
+                                metadata['in_features'], device=device)
+
+    with torch.no_grad():
+        if export_format == 'torchscript':
+            traced = torch.jit.trace(model, example_input)
+            torch.jit.save(traced, path, _extra_files={'metadata.json': json.dumps(metadata)})
+        elif export_format == 'onnx':
+            import onnx
+
+            dynamic_axes = {0: 'batch', 1: 'frames'}
+            torch.onnx.export(model, example_input, path,
+                              input_names=['inputs_2d'], output_names=['predicted_3d'],
+                              dynamic_axes={'inputs_2d': dynamic_axes, 'predicted_3d': dynamic_axes},
+                              opset_version=13)
+            onnx_model = onnx.load(path)
+            for key, value in metadata.items():
+                entry = onnx_model.metadata_props.add()
+                entry.key = key
+                entry.value = str(value)
+            onnx.save(onnx_model, path)
+        else:
+            raise KeyError('Invalid export format')
+
+def check_exported_model(model, exported):
+    """
+    Compare an exported model with the original one on an input whose batch size and length
+    differ from those used for tracing. Returns the maximum absolute difference.
+    """
+    metadata = model_metadata(model)
+    device = next(model.parameters()).device
+    inputs = torch.randn(2, metadata['receptive_field'] + 57, metadata['num_joints_in'],
+                         metadata['in_features'], device=device)
+    with torch.no_grad():
+        model.eval()
+        return torch.max(torch.abs(model(inputs) - exported(inputs))).item()
+
+class ExportedModel:
+    """
+    Wrapper around an exported TorchScript or ONNX model, which can be used in place of
+    a TemporalModel for inference (e.g. in evaluate()).
+    ONNX models are run with onnxruntime on the CPU.
+
+    Arguments:
+    path -- file name of the exported model (.pt or .onnx)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.splitext(path)[1] == '.onnx':
+            import onnxruntime
+
+            self._session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+            props = self._session.get_modelmeta().custom_metadata_map
+            self.metadata = {key: int(value) for key, value in props.items()}
+            self._module = None
+        else:
+            extra_files = {'metadata.json': ''}
+            map_location = 'cuda' if torch.cuda.is_available() else 'cpu'
+            self._module = torch.jit.load(path, map_location=map_location, _extra_files=extra_files)
+            self.metadata = json.loads(extra_files['metadata.json'])
+            self._session = None
+
+        self.num_joints_in = self.metadata['num_joints_in']
+        self.in_features = self.metadata['in_features']
+        self.num_joints_out = self.metadata['num_joints_out']
+
+    def receptive_field(self):
+        return self.metadata['receptive_field']
+
+    def total_causal_shift(self):
+        return self.metadata['total_causal_shift']
+
+    def eval(self):
+        if self._module is not None:
+            self._module.eval()
+        return self
+
+    def __call__(self, inputs_2d):
+        if self._module is not None:
+            return self._module(inputs_2d)
+        outputs = self._session.run(None, {'inputs_2d': inputs_2d.detach().cpu().numpy().astype(np.float32)})
+        return torch.from_numpy(outputs[0]).to(inputs_2d.device)
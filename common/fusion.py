@@ -0,0 +1,75 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import copy
+from time import time
+
+import torch
+import torch.nn as nn
+
+def fuse_conv_bn(conv, bn):
+    """
+    Return a new convolution (with bias) that computes bn(conv(x)) using the
+    running statistics of the batch normalization layer (i.e. evaluation mode).
+    """
+    fused = nn.Conv1d(conv.in_channels, conv.out_channels, conv.kernel_size,
+                      stride=conv.stride, padding=conv.padding, dilation=conv.dilation,
+                      groups=conv.groups, bias=True)
+    fused = fused.to(device=conv.weight.device, dtype=conv.weight.dtype)
+
+    with torch.no_grad():
+        # Compute in double precision to minimize the rounding error of the folding
+        weight = conv.weight.double()
+        bias = conv.bias.double() if conv.bias is not None else torch.zeros_like(bn.running_mean, dtype=torch.float64)
+        scale = 1 / torch.sqrt(bn.running_var.double() + bn.eps)
+        shift = -bn.running_mean.double() * scale
+        if bn.affine:
+            scale = scale * bn.weight.double()
+            shift = shift * bn.weight.double() + bn.bias.double()
+        fused.weight.copy_(weight * scale.view(-1, 1, 1))
+        fused.bias.copy_(bias * scale + shift)
+    return fused
+
+def fuse_model(model):
+    """
+    Build an inference-only copy of a temporal model, in which every BatchNorm layer
+    is folded into the preceding convolution and dropout is removed.
+    The original model is left untouched. The returned model cannot be trained
+    (set_bn_momentum is not supported).
+    """
+    model = copy.deepcopy(model).eval()
+    model.expand_conv = fuse_conv_bn(model.expand_conv, model.expand_bn)
+    model.expand_bn = nn.Identity()
+    for i in range(len(model.layers_conv)):
+        model.layers_conv[i] = fuse_conv_bn(model.layers_conv[i], model.layers_bn[i])
+        model.layers_bn[i] = nn.Identity()
+    model.drop = nn.Identity()
+    return model
+
+def compare_models(reference, candidate, inputs, repeats=5):
+    """
+    Run two models on the same input and return a tuple
+    (max absolute difference, reference time, candidate time), where times
+    are averaged over the given number of repetitions (in seconds).
+    """
+    timings = []
+    outputs = []
+    with torch.no_grad():
+        for model in (reference, candidate):
+            model.eval()
+            output = model(inputs) # Warm-up
+            if inputs.is_cuda:
+                torch.cuda.synchronize() # Do not time the warm-up
+            start_time = time()
+            for _ in range(repeats):
+                model(inputs)
+            if inputs.is_cuda:
+                torch.cuda.synchronize()
+            timings.append((time() - start_time) / repeats)
+            outputs.append(output)
+    max_diff = torch.max(torch.abs(outputs[0] - outputs[1])).item()
+    return max_diff, timings[0], timings[1]
@@ -5,13 +5,20 @@
 # LICENSE file in the root directory of this source tree.
 #
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from itertools import zip_longest
+from threading import Lock
+from time import time
 import numpy as np
 
 class ChunkedGenerator:
     """
     Batched data generator, used for training.
     The sequences are split into equal-length chunks and padded as necessary.
+    Batches are returned as newly allocated float32 arrays.
+    By default, the sequences are copied into a padded float32 array in memory. With out_of_core=True,
+    the batches are read directly from the given sequences (e.g. memory-mapped columnar stores) instead.
     
     Arguments:
     batch_size -- the batch size to use for training
@@ -26,39 +33,74 @@ class ChunkedGenerator:
     augment -- augment the dataset by flipping poses horizontally
     kps_left and kps_right -- list of left/right 2D keypoints if flipping is enabled
     joints_left and joints_right -- list of left/right 3D joints if flipping is enabled
+    shuffle_block -- if > 0, shuffle blocks of this many contiguous chunks (of the same sequence) instead of
+                     single chunks, so that the batches read the sequences (almost) sequentially
+    shuffle_buffer -- with block shuffling, chunks are then shuffled within windows of this many chunks
+    num_shards and shard -- split each epoch into num_shards disjoint subsets of the same size, and only return
+                            the given one (for distributed training, all the processes must use the same seed)
+    out_of_core -- do not copy the sequences in memory, and read each batch from them (see io_stats)
     """
+    # Chunk index (13 bytes per chunk)
+    pair_dtype = np.dtype([('seq', np.int32), ('start', np.int32), ('end', np.int32), ('flip', np.bool_)])
+    
     def __init__(self, batch_size, cameras, poses_3d, poses_2d,
                  chunk_length, pad=0, causal_shift=0,
                  shuffle=True, random_seed=1234,
                  augment=False, kps_left=None, kps_right=None, joints_left=None, joints_right=None,
-                 endless=False):
+                 endless=False, shuffle_block=0, shuffle_buffer=0, num_shards=1, shard=0,
+                 out_of_core=False):
         assert poses_3d is None or len(poses_3d) == len(poses_2d), (len(poses_3d), len(poses_2d))
         assert cameras is None or len(cameras) == len(poses_2d)
     
         # Build lineage info
-        pairs = [] # (seq_idx, start_frame, end_frame, flip) tuples
+        pairs = [] # Arrays of (seq_idx, start_frame, end_frame, flip) records
         for i in range(len(poses_2d)):
             assert poses_3d is None or poses_3d[i].shape[0] == poses_3d[i].shape[0]
             n_chunks = (poses_2d[i].shape[0] + chunk_length - 1) // chunk_length
             offset = (n_chunks * chunk_length - poses_2d[i].shape[0]) // 2
             bounds = np.arange(n_chunks+1)*chunk_length - offset
-            augment_vector = np.full(len(bounds - 1), False, dtype=bool)
-            pairs += zip(np.repeat(i, len(bounds - 1)), bounds[:-1], bounds[1:], augment_vector)
+            seq_pairs = np.empty(n_chunks, dtype=self.pair_dtype)
+            seq_pairs['seq'] = i
+            seq_pairs['start'] = bounds[:-1]
+            seq_pairs['end'] = bounds[1:]
+            seq_pairs['flip'] = False
+            pairs.append(seq_pairs)
             if augment:
-                pairs += zip(np.repeat(i, len(bounds - 1)), bounds[:-1], bounds[1:], ~augment_vector)
+                seq_pairs = seq_pairs.copy()
+                seq_pairs['flip'] = True
+                pairs.append(seq_pairs)
+        pairs = np.concatenate(pairs) if len(pairs) > 0 else np.empty(0, dtype=self.pair_dtype)
 
-        # Initialize buffers
+        if not out_of_core:
+            # Pre-pad each sequence by enough frames to cover any chunk (including the chunks that overflow
+            # the sequence boundaries), and store all of them in one float32 array. A batch can then be
+            # assembled with a single gather.
+            self.storage_2d, self.offsets_2d = self._build_storage(poses_2d, pad + causal_shift + chunk_length,
+                                                                   pad - causal_shift + chunk_length)
+            if poses_3d is not None:
+                self.storage_3d, self.offsets_3d = self._build_storage(poses_3d, chunk_length, chunk_length)
         if cameras is not None:
-            self.batch_cam = np.empty((batch_size, cameras[0].shape[-1]))
-        if poses_3d is not None:
-            self.batch_3d = np.empty((batch_size, chunk_length, poses_3d[0].shape[-2], poses_3d[0].shape[-1]))
-        self.batch_2d = np.empty((batch_size, chunk_length + 2*pad, poses_2d[0].shape[-2], poses_2d[0].shape[-1]))
+            self.storage_cam = np.stack(cameras).astype('float32')
+        self.window_2d = np.arange(chunk_length + 2*pad)
+        self.window_3d = np.arange(chunk_length)
+
+        if augment:
+            # Flipping is a left/right permutation of the keypoints followed by a sign change of x
+            self.flip_2d = self._flip_permutation(poses_2d[0].shape[-2], kps_left, kps_right)
+            if poses_3d is not None:
+                self.flip_3d = self._flip_permutation(poses_3d[0].shape[-2], joints_left, joints_right)
 
-        self.num_batches = (len(pairs) + batch_size - 1) // batch_size
+        assert 0 <= shard < num_shards
+        self.num_batches = (len(pairs) // num_shards + batch_size - 1) // batch_size
         self.batch_size = batch_size
         self.random = np.random.RandomState(random_seed)
         self.pairs = pairs
         self.shuffle = shuffle
+        self.shuffle_block = shuffle_block
+        self.shuffle_buffer = shuffle_buffer
+        self.num_shards = num_shards
+        self.shard = shard
+        self.out_of_core = out_of_core
         self.pad = pad
         self.causal_shift = causal_shift
         self.endless = endless
@@ -74,6 +116,11 @@ class ChunkedGenerator:
         self.joints_left = joints_left
         self.joints_right = joints_right
         
+        # I/O statistics, only with out_of_core (see io_stats)
+        self._io_lock = Lock()
+        self._io_bytes = 0
+        self._io_time = 0
+        
     def num_frames(self):
         return self.num_batches * self.batch_size
     
@@ -88,76 +135,157 @@ class ChunkedGenerator:
     
     def next_pairs(self):
         if self.state is None:
-            if self.shuffle:
-                pairs = self.random.permutation(self.pairs)
+            if self.shuffle and self.shuffle_block > 0:
+                pairs = self.pairs[self._block_permutation()]
+            elif self.shuffle:
+                # Same random draws as permuting the records themselves
+                pairs = self.pairs[self.random.permutation(len(self.pairs))]
             else:
                 pairs = self.pairs
+            if self.num_shards > 1:
+                # Every shard takes a contiguous slice of the (shuffled) chunks, so that the shuffled blocks
+                # are not spread over all the shards (the remainder is dropped)
+                shard_size = len(pairs) // self.num_shards
+                pairs = pairs[self.shard * shard_size : (self.shard + 1) * shard_size]
             return 0, pairs
         else:
             return self.state
     
+    def _block_permutation(self):
+        # Chunks are stored sequence by sequence, so consecutive chunks read neighbouring frames
+        n = len(self.pairs)
+        n_blocks = (n + self.shuffle_block - 1) // self.shuffle_block
+        blocks = self.random.permutation(n_blocks)
+        order = (blocks[:, None] * self.shuffle_block + np.arange(self.shuffle_block)).ravel()
+        order = order[order < n]
+        if self.shuffle_buffer > 1:
+            # Shuffle the chunks within consecutive windows of shuffle_buffer chunks
+            window = np.arange(n) // self.shuffle_buffer
+            order = order[np.lexsort((self.random.random_sample(n), window))]
+        return order
+    
+    def io_stats(self, reset=True):
+        """
+        With out_of_core, return a tuple (bytes, seconds) with the volume read from the sequences by get_batch()
+        since the last reset, counted in 4 KB pages (i.e. what is read from a memory-mapped file, if the page
+        cache is cold), and the time spent assembling these batches. Both are 0 otherwise.
+        """
+        with self._io_lock:
+            stats = (self._io_bytes, self._io_time)
+            if reset:
+                self._io_bytes = 0
+                self._io_time = 0
+        return stats
+    
+    @staticmethod
+    def _read_windows(sequences, seq_i, starts, window, page_size=4096):
+        """
+        Read the windows starts[i] + window of the sequences seq_i[i], padded by replicating
+        the first/last frame of the sequence (as the 'edge' padding of the in-memory storage).
+        Each sequence is read once, and only at the frames that the batch needs.
+        Returns the batch and the number of distinct pages that were read.
+        """
+        batch = np.empty((len(seq_i), len(window)) + sequences[0].shape[1:], dtype='float32')
+        pages = []
+        for i in np.unique(seq_i):
+            rows = np.nonzero(seq_i == i)[0]
+            seq = sequences[i]
+            idx = np.clip(starts[rows, None] + window, 0, seq.shape[0] - 1)
+            frames = np.unique(idx)
+            batch[rows] = seq[frames][np.searchsorted(frames, idx)]
+            pages.append(ChunkedGenerator._frame_pages(seq, frames, page_size))
+        return batch, len(np.unique(np.concatenate(pages)))
+    
+    @staticmethod
+    def _frame_pages(seq, frames, page_size):
+        # Pages of the address space that hold the given frames of a sequence. The sequence can be a view at any
+        # offset into a larger array (e.g. a columnar store) or a strided view (e.g. downsampled), and since
+        # memory maps are page-aligned, these are the pages of the file for a memory-mapped sequence.
+        address = seq.__array_interface__['data'][0]
+        first = address + frames * seq.strides[0]
+        last = first + sum((n - 1) * stride for n, stride in zip(seq.shape[1:], seq.strides[1:])) + seq.itemsize - 1
+        first_page = first // page_size
+        last_page = last // page_size
+        span = first_page[:, None] + np.arange((last_page - first_page).max() + 1)
+        return span[span <= last_page[:, None]]
+    
+    @staticmethod
+    def _build_storage(sequences, pad_left, pad_right):
+        padded = [np.pad(seq, ((pad_left, pad_right), (0, 0), (0, 0)), 'edge') for seq in sequences]
+        lengths = np.array([seq.shape[0] for seq in padded], dtype=np.int64)
+        offsets = np.cumsum(lengths) - lengths + pad_left # Position of the first frame of each sequence
+        return np.concatenate(padded).astype('float32'), offsets
+    
+    @staticmethod
+    def _flip_permutation(num_joints, left, right):
+        permutation = np.arange(num_joints)
+        permutation[left + right] = permutation[right + left]
+        return permutation
+    
+    def get_batch(self, chunks):
+        """
+        Assemble the batch corresponding to an array of chunks (with dtype pair_dtype).
+        Returns a tuple (batch_cam, batch_3d, batch_2d) of newly allocated float32 arrays
+        (batch_cam and batch_3d are None if cameras or 3D poses are not available).
+        """
+        start_time = time()
+        seq_i = chunks['seq']
+        start_3d = chunks['start'].astype(np.int64)
+        flip = chunks['flip']
+
+        pages = 0
+        if self.out_of_core:
+            batch_2d, pages = self._read_windows(self.poses_2d, seq_i, start_3d - self.pad - self.causal_shift,
+                                                 self.window_2d)
+        else:
+            start_2d = self.offsets_2d[seq_i] + start_3d - self.pad - self.causal_shift
+            batch_2d = self.storage_2d[start_2d[:, None] + self.window_2d]
+        if self.augment and flip.any():
+            # Flip 2D keypoints
+            flipped = batch_2d[flip][:, :, self.flip_2d]
+            flipped[:, :, :, 0] *= -1
+            batch_2d[flip] = flipped
+
+        batch_3d = None
+        if self.poses_3d is not None:
+            if self.out_of_core:
+                batch_3d, pages_3d = self._read_windows(self.poses_3d, seq_i, start_3d, self.window_3d)
+                pages += pages_3d
+            else:
+                start_3d = self.offsets_3d[seq_i] + start_3d
+                batch_3d = self.storage_3d[start_3d[:, None] + self.window_3d]
+            if self.augment and flip.any():
+                # Flip 3D joints
+                flipped = batch_3d[flip][:, :, self.flip_3d]
+                flipped[:, :, :, 0] *= -1
+                batch_3d[flip] = flipped
+
+        batch_cam = None
+        if self.cameras is not None:
+            batch_cam = self.storage_cam[seq_i]
+            # Flip horizontal distortion coefficients
+            batch_cam[flip, 2] *= -1
+            batch_cam[flip, 7] *= -1
+
+        if self.out_of_core:
+            elapsed = time() - start_time
+            with self._io_lock:
+                self._io_bytes += pages * 4096
+                self._io_time += elapsed
+
+        return batch_cam, batch_3d, batch_2d
+    
     def next_epoch(self):
         enabled = True
         while enabled:
             start_idx, pairs = self.next_pairs()
             for b_i in range(start_idx, self.num_batches):
                 chunks = pairs[b_i*self.batch_size : (b_i+1)*self.batch_size]
-                for i, (seq_i, start_3d, end_3d, flip) in enumerate(chunks):
-                    start_2d = start_3d - self.pad - self.causal_shift
-                    end_2d = end_3d + self.pad - self.causal_shift
-
-                    # 2D poses
-                    seq_2d = self.poses_2d[seq_i]
-                    low_2d = max(start_2d, 0)
-                    high_2d = min(end_2d, seq_2d.shape[0])
-                    pad_left_2d = low_2d - start_2d
-                    pad_right_2d = end_2d - high_2d
-                    if pad_left_2d != 0 or pad_right_2d != 0:
-                        self.batch_2d[i] = np.pad(seq_2d[low_2d:high_2d], ((pad_left_2d, pad_right_2d), (0, 0), (0, 0)), 'edge')
-                    else:
-                        self.batch_2d[i] = seq_2d[low_2d:high_2d]
-
-                    if flip:
-                        # Flip 2D keypoints
-                        self.batch_2d[i, :, :, 0] *= -1
-                        self.batch_2d[i, :, self.kps_left + self.kps_right] = self.batch_2d[i, :, self.kps_right + self.kps_left]
-
-                    # 3D poses
-                    if self.poses_3d is not None:
-                        seq_3d = self.poses_3d[seq_i]
-                        low_3d = max(start_3d, 0)
-                        high_3d = min(end_3d, seq_3d.shape[0])
-                        pad_left_3d = low_3d - start_3d
-                        pad_right_3d = end_3d - high_3d
-                        if pad_left_3d != 0 or pad_right_3d != 0:
-                            self.batch_3d[i] = np.pad(seq_3d[low_3d:high_3d], ((pad_left_3d, pad_right_3d), (0, 0), (0, 0)), 'edge')
-                        else:
-                            self.batch_3d[i] = seq_3d[low_3d:high_3d]
-
-                        if flip:
-                            # Flip 3D joints
-                            self.batch_3d[i, :, :, 0] *= -1
-                            self.batch_3d[i, :, self.joints_left + self.joints_right] = \
-                                    self.batch_3d[i, :, self.joints_right + self.joints_left]
-
-                    # Cameras
-                    if self.cameras is not None:
-                        self.batch_cam[i] = self.cameras[seq_i]
-                        if flip:
-                            # Flip horizontal distortion coefficients
-                            self.batch_cam[i, 2] *= -1
-                            self.batch_cam[i, 7] *= -1
+                batch_cam, batch_3d, batch_2d = self.get_batch(chunks)
 
                 if self.endless:
                     self.state = (b_i + 1, pairs)
-                if self.poses_3d is None and self.cameras is None:
-                    yield None, None, self.batch_2d[:len(chunks)]
-                elif self.poses_3d is not None and self.cameras is None:
-                    yield None, self.batch_3d[:len(chunks)], self.batch_2d[:len(chunks)]
-                elif self.poses_3d is None:
-                    yield self.batch_cam[:len(chunks)], None, self.batch_2d[:len(chunks)]
-                else:
-                    yield self.batch_cam[:len(chunks)], self.batch_3d[:len(chunks)], self.batch_2d[:len(chunks)]
+                yield batch_cam, batch_3d, batch_2d
             
             if self.endless:
                 self.state = None
@@ -165,6 +293,74 @@ class ChunkedGenerator:
                 enabled = False
             
 
+class PrefetchGenerator:
+    """
+    Wrapper around a ChunkedGenerator that assembles the upcoming batches in background threads,
+    so that the training step does not wait for the data.
+    The chunks of each batch are still drawn in the calling thread, in the same order and with the same
+    random generator as the wrapped generator, so the random state (as saved in the checkpoints) is
+    the same as without prefetching. A new shuffle is only drawn when the first batch of the next
+    pass is requested, as in ChunkedGenerator.
+    
+    Arguments:
+    generator -- the ChunkedGenerator to wrap
+    queue_depth -- maximum number of batches assembled in advance
+    num_workers -- number of threads used to assemble the batches
+    """
+    def __init__(self, generator, queue_depth=2, num_workers=1):
+        assert queue_depth > 0 and num_workers > 0
+        self.generator = generator
+        self.queue_depth = queue_depth
+        self.num_workers = num_workers
+        self.blocked_time = 0 # Total time spent waiting for a batch (in seconds)
+        
+    def num_frames(self):
+        return self.generator.num_frames()
+    
+    def random_state(self):
+        return self.generator.random_state()
+    
+    def set_random_state(self, random):
+        self.generator.set_random_state(random)
+        
+    def augment_enabled(self):
+        return self.generator.augment_enabled()
+    
+    def io_stats(self, reset=True):
+        return self.generator.io_stats(reset)
+    
+    def next_epoch(self):
+        gen = self.generator
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            enabled = True
+            while enabled:
+                start_idx, pairs = gen.next_pairs()
+                pending = deque()
+                for b_i in range(start_idx, gen.num_batches):
+                    chunks = pairs[b_i*gen.batch_size : (b_i+1)*gen.batch_size]
+                    pending.append((b_i, executor.submit(gen.get_batch, chunks)))
+                    # The oldest batch is returned once queue_depth batches are being assembled behind it
+                    if len(pending) > self.queue_depth:
+                        yield self._pop(pending, pairs)
+                while len(pending) > 0:
+                    yield self._pop(pending, pairs)
+                
+                if gen.endless:
+                    gen.state = None
+                else:
+                    enabled = False
+                    
+    def _pop(self, pending, pairs):
+        b_i, future = pending.popleft()
+        start_time = time()
+        batch = future.result()
+        self.blocked_time += time() - start_time
+        if self.generator.endless:
+            # Batches that are prefetched but never consumed are simply generated again
+            self.generator.state = (b_i + 1, pairs)
+        return batch
+            
+
 class UnchunkedGenerator:
     """
     Non-batched data generator, used for testing.
@@ -236,4 +432,164 @@ class UnchunkedGenerator:
                 batch_2d[1, :, :, 0] *= -1
                 batch_2d[1, :, self.kps_left + self.kps_right] = batch_2d[1, :, self.kps_right + self.kps_left]
 
-            yield batch_cam, batch_3d, batch_2d
\ No newline at end of file
+            yield batch_cam, batch_3d, batch_2d
+
+class PackedGenerator:
+    """
+    Batched data generator for inference on many (short) sequences.
+    Each sequence is padded as in UnchunkedGenerator, and the padded sequences are concatenated
+    along the time axis into rows of at most max_frames input frames. Since the model only uses
+    valid convolutions, the output frames of each sequence only depend on its own padded input,
+    and the outputs that straddle two sequences are simply discarded.
+    
+    Each batch is returned as a tuple (batch_2d, segments), where segments is a list of
+    (sequence index, row, first output frame, number of frames) tuples that can be used to
+    scatter the predictions back to each sequence.
+    If data augmentation is enabled, the rows of each batch are followed by their mirrored versions.
+    
+    Arguments:
+    poses_2d -- list of input 2D keypoints, one element for each video
+    max_frames -- maximum number of input frames in each row (longer sequences get a row on their own)
+    batch_size -- number of rows in each batch
+    pad -- 2D input padding to compensate for valid convolutions, per side (depends on the receptive field)
+    causal_shift -- asymmetric padding offset when causal convolutions are used (usually 0 or "pad")
+    augment -- augment the dataset by flipping poses horizontally
+    kps_left and kps_right -- list of left/right 2D keypoints if flipping is enabled
+    """
+    
+    def __init__(self, poses_2d, max_frames=8192, batch_size=8, pad=0, causal_shift=0,
+                 augment=False, kps_left=None, kps_right=None):
+        self.poses_2d = poses_2d
+        self.max_frames = max_frames
+        self.batch_size = batch_size
+        self.pad = pad
+        self.causal_shift = causal_shift
+        self.augment = augment
+        self.kps_left = kps_left
+        self.kps_right = kps_right
+        
+        # Pack the longest sequences first, so that rows in the same batch have similar lengths
+        rows = [] # Lists of sequence indices
+        row_frames = 0
+        for seq_i in sorted(range(len(poses_2d)), key=lambda i: -poses_2d[i].shape[0]):
+            frames = poses_2d[seq_i].shape[0] + 2*pad
+            if len(rows) == 0 or row_frames + frames > max_frames:
+                rows.append([])
+                row_frames = 0
+            rows[-1].append(seq_i)
+            row_frames += frames
+        self.rows = rows
+        
+    def num_frames(self):
+        count = 0
+        for p in self.poses_2d:
+            count += p.shape[0]
+        return count
+    
+    def augment_enabled(self):
+        return self.augment
+    
+    def next_epoch(self):
+        for b_i in range(0, len(self.rows), self.batch_size):
+            rows_2d = []
+            segments = []
+            for row_i, row in enumerate(self.rows[b_i : b_i + self.batch_size]):
+                row_2d = []
+                offset = 0
+                for seq_i in row:
+                    seq_2d = np.pad(self.poses_2d[seq_i],
+                                    ((self.pad + self.causal_shift, self.pad - self.causal_shift), (0, 0), (0, 0)),
+                                    'edge')
+                    segments.append((seq_i, row_i, offset, self.poses_2d[seq_i].shape[0]))
+                    row_2d.append(seq_2d)
+                    offset += seq_2d.shape[0]
+                rows_2d.append(np.concatenate(row_2d, axis=0))
+            
+            # Pad all the rows to the same length (the extra outputs are discarded)
+            length = max(row.shape[0] for row in rows_2d)
+            batch_2d = np.stack([np.pad(row, ((0, length - row.shape[0]), (0, 0), (0, 0)), 'edge')
+                                 for row in rows_2d]).astype('float32')
+            
+            if self.augment:
+                # Append flipped version
+                flipped = batch_2d.copy()
+                flipped[:, :, :, 0] *= -1
+                flipped[:, :, self.kps_left + self.kps_right] = flipped[:, :, self.kps_right + self.kps_left]
+                batch_2d = np.concatenate((batch_2d, flipped), axis=0)
+            
+            yield batch_2d, segments
+
+class BucketedGenerator:
+    """
+    Batched data generator for the evaluation of many sequences.
+    The sequences are sorted by length and grouped into batches of sequences of similar length.
+    Each sequence is padded as in UnchunkedGenerator, and then extended (by repeating its last frame)
+    to the length of the longest sequence of its batch: the predictions of these extra frames
+    must be masked out using the lengths returned with each batch.
+    
+    Each batch is returned as a tuple (batch_3d, batch_2d, indices, lengths), where indices and lengths
+    are the index and the number of frames of the sequence in each row.
+    If data augmentation is enabled, the rows of batch_2d are followed by their mirrored versions
+    (the 3D poses are not mirrored, since they are only used as ground truth).
+    
+    Arguments:
+    poses_3d -- list of ground-truth 3D poses, one element for each video (optional)
+    poses_2d -- list of input 2D keypoints, one element for each video
+    batch_size -- maximum number of sequences in each batch
+    max_frames -- maximum number of (padded) input frames in each batch (longer sequences get a batch on their own)
+    pad -- 2D input padding to compensate for valid convolutions, per side (depends on the receptive field)
+    causal_shift -- asymmetric padding offset when causal convolutions are used (usually 0 or "pad")
+    augment -- augment the dataset by flipping poses horizontally
+    kps_left and kps_right -- list of left/right 2D keypoints if flipping is enabled
+    """
+    
+    def __init__(self, poses_3d, poses_2d, batch_size=8, max_frames=65536, pad=0, causal_shift=0,
+                 augment=False, kps_left=None, kps_right=None):
+        assert poses_3d is None or len(poses_3d) == len(poses_2d)
+        self.poses_3d = poses_3d
+        self.poses_2d = poses_2d
+        self.pad = pad
+        self.causal_shift = causal_shift
+        self.augment = augment
+        self.kps_left = kps_left
+        self.kps_right = kps_right
+        
+        # Since the sequences are sorted, the last one of each batch is the longest
+        batches = [] # Lists of sequence indices
+        for seq_i in sorted(range(len(poses_2d)), key=lambda i: poses_2d[i].shape[0]):
+            frames = poses_2d[seq_i].shape[0] + 2*pad
+            if len(batches) == 0 or len(batches[-1]) == batch_size or (len(batches[-1]) + 1) * frames > max_frames:
+                batches.append([])
+            batches[-1].append(seq_i)
+        self.batches = batches
+        
+    def num_frames(self):
+        count = 0
+        for p in self.poses_2d:
+            count += p.shape[0]
+        return count
+    
+    def augment_enabled(self):
+        return self.augment
+    
+    def next_epoch(self):
+        for indices in self.batches:
+            lengths = np.array([self.poses_2d[i].shape[0] for i in indices])
+            length = lengths.max()
+            batch_2d = np.stack([np.pad(self.poses_2d[i],
+                                        ((self.pad + self.causal_shift, self.pad - self.causal_shift + length - n),
+                                         (0, 0), (0, 0)), 'edge')
+                                 for i, n in zip(indices, lengths)]).astype('float32')
+            batch_3d = None
+            if self.poses_3d is not None:
+                batch_3d = np.stack([np.pad(self.poses_3d[i], ((0, length - n), (0, 0), (0, 0)), 'edge')
+                                     for i, n in zip(indices, lengths)]).astype('float32')
+            
+            if self.augment:
+                # Append flipped version
+                flipped = batch_2d.copy()
+                flipped[:, :, :, 0] *= -1
+                flipped[:, :, self.kps_left + self.kps_right] = flipped[:, :, self.kps_right + self.kps_left]
+                batch_2d = np.concatenate((batch_2d, flipped), axis=0)
+            
+            yield batch_3d, batch_2d, indices, lengths
@@ -7,15 +7,11 @@
 
 import numpy as np
 import copy
-from common.skeleton import Skeleton
-from common.mocap_dataset import MocapDataset
+from common.h36m_skeleton import h36m_skeleton, h36m_static_joints, h36m_skeleton_17
+from common.mocap_dataset import MocapDataset, select_data
 from common.camera import normalize_screen_coordinates, image_coordinates
+from common.columnar import ColumnarStore, is_store
        
-h36m_skeleton = Skeleton(parents=[-1,  0,  1,  2,  3,  4,  0,  6,  7,  8,  9,  0, 11, 12, 13, 14, 12,
-       16, 17, 18, 19, 20, 19, 22, 12, 24, 25, 26, 27, 28, 27, 30],
-       joints_left=[6, 7, 8, 9, 10, 16, 17, 18, 19, 20, 21, 22, 23],
-       joints_right=[1, 2, 3, 4, 5, 24, 25, 26, 27, 28, 29, 30, 31])
-
 h36m_cameras_intrinsic_params = [
     {
         'id': '54138969',
@@ -207,8 +203,8 @@ h36m_cameras_extrinsic_params = {
 }
 
 class Human36mDataset(MocapDataset):
-    def __init__(self, path, remove_static_joints=True):
-        super().__init__(fps=50, skeleton=h36m_skeleton)
+    def __init__(self, path, remove_static_joints=True, subjects=None, actions=None, load_positions=True):
+        super().__init__(fps=50, skeleton=copy.deepcopy(h36m_skeleton))
         
         self._cameras = copy.deepcopy(h36m_cameras_extrinsic_params)
         for cameras in self._cameras.values():
@@ -230,8 +226,14 @@ class Human36mDataset(MocapDataset):
                                                    cam['radial_distortion'],
                                                    cam['tangential_distortion']))
         
-        # Load serialized dataset
-        data = np.load(path, allow_pickle=True)['positions_3d'].item()
+        # Load serialized dataset (.npz archive or columnar store), only keeping the requested subjects/actions.
+        # Without load_positions, only the skeleton and the cameras are loaded (see add_action)
+        if not load_positions:
+            data = {}
+        elif is_store(path):
+            data = ColumnarStore(path).load('positions_3d', subjects, actions)
+        else:
+            data = select_data(np.load(path, allow_pickle=True)['positions_3d'].item(), subjects, actions)
         
         self._data = {}
         for subject, actions in data.items():
@@ -244,7 +246,7 @@ class Human36mDataset(MocapDataset):
                 
         if remove_static_joints:
             # Bring the skeleton to 17 joints instead of the original 32
-            self.remove_joints([4, 5, 9, 10, 11, 16, 20, 21, 22, 23, 24, 28, 29, 30, 31])
+            self.remove_joints(h36m_static_joints)
             
             # Rewire shoulders to the correct parents
             self._skeleton._parents[11] = 8
@@ -0,0 +1,33 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+# Human3.6M skeleton, in a module of its own so that it can be used for inference
+# without importing the dataset code (see lift.py)
+import copy
+
+from common.skeleton import Skeleton
+
+h36m_skeleton = Skeleton(parents=[-1,  0,  1,  2,  3,  4,  0,  6,  7,  8,  9,  0, 11, 12, 13, 14, 12,
+       16, 17, 18, 19, 20, 19, 22, 12, 24, 25, 26, 27, 28, 27, 30],
+       joints_left=[6, 7, 8, 9, 10, 16, 17, 18, 19, 20, 21, 22, 23],
+       joints_right=[1, 2, 3, 4, 5, 24, 25, 26, 27, 28, 29, 30, 31])
+
+# Joints removed to bring the skeleton to 17 joints (see remove_static_joints)
+h36m_static_joints = [4, 5, 9, 10, 11, 16, 20, 21, 22, 23, 24, 28, 29, 30, 31]
+
+def h36m_skeleton_17():
+    """
+    Return a copy of the Human3.6M skeleton reduced to 17 joints, i.e. the skeleton of the datasets
+    loaded with remove_static_joints=True (e.g. for inference without a dataset).
+    """
+    skeleton = copy.deepcopy(h36m_skeleton)
+    skeleton.remove_joints(h36m_static_joints)
+    
+    # Rewire shoulders to the correct parents
+    skeleton._parents[11] = 8
+    skeleton._parents[14] = 8
+    return skeleton
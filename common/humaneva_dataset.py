@@ -8,8 +8,9 @@
 import numpy as np
 import copy
 from common.skeleton import Skeleton
-from common.mocap_dataset import MocapDataset
+from common.mocap_dataset import MocapDataset, select_data
 from common.camera import normalize_screen_coordinates, image_coordinates
+from common.columnar import ColumnarStore, is_store
        
 humaneva_skeleton = Skeleton(parents=[-1, 0, 1, 2, 3, 1, 5, 6, 0, 8, 9, 0, 11, 12, 1],
        joints_left=[2, 3, 4, 8, 9, 10],
@@ -88,7 +89,7 @@ humaneva_cameras_extrinsic_params = {
 }
 
 class HumanEvaDataset(MocapDataset):
-    def __init__(self, path):
+    def __init__(self, path, subjects=None, actions=None, load_positions=True):
         super().__init__(fps=60, skeleton=humaneva_skeleton)
         
         self._cameras = copy.deepcopy(humaneva_cameras_extrinsic_params)
@@ -107,8 +108,14 @@ class HumanEvaDataset(MocapDataset):
             for prefix in ['Train/', 'Validate/', 'Unlabeled/Train/', 'Unlabeled/Validate/', 'Unlabeled/']:
                 self._cameras[prefix + subject] = data
         
-        # Load serialized dataset
-        data = np.load(path, allow_pickle=True)['positions_3d'].item()
+        # Load serialized dataset (.npz archive or columnar store), only keeping the requested subjects/actions.
+        # Without load_positions, only the skeleton and the cameras are loaded (see add_action)
+        if not load_positions:
+            data = {}
+        elif is_store(path):
+            data = ColumnarStore(path).load('positions_3d', subjects, actions)
+        else:
+            data = select_data(np.load(path, allow_pickle=True)['positions_3d'].item(), subjects, actions)
         
         self._data = {}
         for subject, actions in data.items():
@@ -0,0 +1,329 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+import torch
+
+from common.generators import PackedGenerator
+from common.model import TemporalModel, TemporalModelPosTraj
+
+def windowed_forward(model, inputs_2d, window_size, num_workers=1, tile_context=None):
+    """
+    Evaluate a temporal model on a long (padded) sequence by splitting it into tiles
+    of window_size output frames. Each tile is extended by (receptive_field - 1) frames
+    of context, so the concatenated output is the same as running the model on the whole
+    sequence, while the peak activation memory only depends on the tile size.
+
+    Arguments:
+    model -- temporal model (must implement receptive_field())
+    inputs_2d -- padded input tensor of shape (N, T + receptive_field - 1, J, F)
+    window_size -- number of output frames per tile
+    num_workers -- number of tiles to evaluate concurrently (peak memory grows accordingly)
+    tile_context -- optional function returning a context manager entered around each tile
+                    (e.g. autocast, which is thread-local like grad mode)
+    """
+    assert window_size > 0
+    context = model.receptive_field() - 1
+    out_frames = inputs_2d.shape[1] - context
+    if tile_context is None:
+        tile_context = nullcontext
+    if out_frames <= window_size:
+        with tile_context():
+            return model(inputs_2d)
+
+    # Grad mode is thread-local, so it must be propagated to the workers
+    grad_enabled = torch.is_grad_enabled()
+
+    def run_tile(start):
+        end = min(start + window_size, out_frames)
+        with torch.set_grad_enabled(grad_enabled), tile_context():
+            return model(inputs_2d[:, start : end + context])
+
+    starts = range(0, out_frames, window_size)
+    if num_workers > 1:
+        # Torch releases the GIL in its kernels, so a thread pool is enough to overlap tiles
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            outputs = list(executor.map(run_tile, starts))
+    else:
+        outputs = [run_tile(start) for start in starts]
+    return torch.cat(outputs, dim=1)
+
+def packed_predict(model, generator, joints_left=None, joints_right=None, device=None):
+    """
+    Run a temporal model on all the sequences of a PackedGenerator, and return the predictions
+    (NumPy arrays) of each sequence, in the same order as the input sequences.
+    If augmentation is enabled in the generator, the flipped predictions are mirrored back
+    and averaged with the original ones.
+
+    Arguments:
+    model -- temporal model
+    generator -- PackedGenerator
+    joints_left and joints_right -- list of left/right 3D joints to swap back when flipping
+                                    (None for the trajectory model, which only has one joint)
+    device -- device on which the inputs are copied (optional)
+    """
+    predictions = [None] * len(generator.poses_2d)
+    with torch.no_grad():
+        model.eval()
+        for batch_2d, segments in generator.next_epoch():
+            inputs_2d = torch.from_numpy(batch_2d)
+            if device is not None:
+                inputs_2d = inputs_2d.to(device)
+            predicted_3d_pos = model(inputs_2d)
+
+            if generator.augment_enabled():
+                # Undo flipping and take average with non-flipped version
+                rows = predicted_3d_pos.shape[0] // 2
+                flipped = predicted_3d_pos[rows:]
+                flipped[:, :, :, 0] *= -1
+                if joints_left is not None:
+                    flipped[:, :, joints_left + joints_right] = flipped[:, :, joints_right + joints_left]
+                predicted_3d_pos = (predicted_3d_pos[:rows] + flipped) / 2
+
+            predicted_3d_pos = predicted_3d_pos.cpu().numpy()
+            for seq_i, row, start, length in segments:
+                predictions[seq_i] = predicted_3d_pos[row, start : start + length]
+    return predictions
+
+def _sparse_conv(conv, x, columns):
+    # Evaluate a (possibly dilated or grouped) valid Conv1d only at the given output columns,
+    # where columns[m, k] is the position in x of the input of tap k for the m-th output
+    cols = x[:, :, columns] # (N, C_in, M, K)
+    n, c_in, m, k = cols.shape
+    groups = conv.groups
+    weight = conv.weight.view(groups, -1, c_in // groups, k)
+    out = torch.einsum('ngcmk,gock->ngom', cols.view(n, groups, c_in // groups, m, k), weight)
+    out = out.reshape(n, -1, m)
+    if conv.bias is not None:
+        out = out + conv.bias.view(1, -1, 1)
+    return out
+
+def _supports_sparse(model):
+    if not isinstance(model, (TemporalModel, TemporalModelPosTraj)):
+        return False
+    convs = [model.expand_conv] + list(model.layers_conv)
+    return all(type(conv) is torch.nn.Conv1d and conv.stride == (1,) for conv in convs)
+
+def _keyframe_plan(model, frames):
+    """
+    Return the columns that each layer of a TemporalModel (or TemporalModelPosTraj) must compute
+    for the given output frames, i.e. the union of the dependency cones of these frames.
+    plan[0] are the input frames, plan[1] the outputs of expand_conv, and plan[i + 2] the outputs of block i,
+    in the coordinates of the layer outputs (valid convolutions, so input column c + j * dilation feeds output c).
+    """
+    plan = [frames]
+    for i in reversed(range(len(model.pad) - 1)):
+        conv = model.layers_conv[2*i]
+        taps = np.arange(conv.kernel_size[0]) * conv.dilation[0]
+        residual = plan[0] + model.pad[i+1] + model.causal_shift[i+1]
+        plan.insert(0, np.union1d(np.unique(plan[0][:, None] + taps), residual))
+    taps = np.arange(model.expand_conv.kernel_size[0]) * model.expand_conv.dilation[0]
+    plan.insert(0, np.unique(plan[0][:, None] + taps))
+    return plan
+
+def _plan_density(model, plan, input_frames):
+    # Fraction of the multiply-accumulates of the dense evaluation that the plan computes
+    layers = [(model.expand_conv, 0)]
+    layers += [(model.layers_conv[2*i], model.layers_conv[2*i + 1].weight.numel()) for i in range(len(model.pad) - 1)]
+    sparse = 0
+    dense = 0
+    length = input_frames
+    for (conv, pointwise_macs), columns in zip(layers, plan[1:]):
+        length -= (conv.kernel_size[0] - 1) * conv.dilation[0]
+        macs = conv.weight.numel() + pointwise_macs # Per output column
+        sparse += len(columns) * macs
+        dense += length * macs
+    return sparse / dense
+
+def _sparse_forward(model, x, plan):
+    # x: (N, C, T) input columns plan[0] (already gathered); returns (N, len(plan[-1]), J, 3)
+    def taps(conv, inputs, outputs):
+        offsets = np.arange(conv.kernel_size[0]) * conv.dilation[0]
+        return torch.as_tensor(np.searchsorted(inputs, outputs[:, None] + offsets), device=x.device)
+
+    x = model.relu(model.expand_bn(_sparse_conv(model.expand_conv, x, taps(model.expand_conv, plan[0], plan[1]))))
+    for i in range(len(model.pad) - 1):
+        inputs, outputs = plan[i+1], plan[i+2]
+        residual = np.searchsorted(inputs, outputs + model.pad[i+1] + model.causal_shift[i+1])
+        res = x[:, :, torch.as_tensor(residual, device=x.device)]
+        conv = model.layers_conv[2*i]
+        x = model.relu(model.layers_bn[2*i](_sparse_conv(conv, x, taps(conv, inputs, outputs))))
+        x = res + model.relu(model.layers_bn[2*i + 1](model.layers_conv[2*i + 1](x)))
+
+    if isinstance(model, TemporalModelPosTraj):
+        pos = model.shrink_pos(x[:, :model.channels]).permute(0, 2, 1)
+        traj = model.shrink_traj(x[:, model.channels:]).permute(0, 2, 1)
+        return pos.reshape(x.shape[0], -1, model.num_joints_out, 3) + traj.reshape(x.shape[0], -1, 1, 3)
+    x = model.shrink(x).permute(0, 2, 1)
+    return x.reshape(x.shape[0], -1, model.num_joints_out, 3)
+
+def predict_keyframes(model, poses_2d, frames, pad, causal_shift, batch_size=1024, device=None,
+                      augment=False, kps_left=None, kps_right=None, joints_left=None, joints_right=None,
+                      max_density=0.8):
+    """
+    Predict the 3D poses of a subset of frames of a sequence.
+    For TemporalModel and TemporalModelPosTraj (also with fused BatchNorm), only the union of the dependency
+    cones of the target frames is computed: every layer is evaluated at the columns that the target frames
+    depend on, so the activations shared between nearby frames are computed once. If this still amounts
+    to more than max_density of the dense computation (e.g. frames that are close to each other), or for
+    other models (e.g. quantized or exported), the model is evaluated densely and the outputs are subsampled.
+
+    Arguments:
+    model -- temporal model (as configured for evaluation)
+    poses_2d -- input 2D keypoints of the sequence (unpadded), of shape (T, J, F)
+    frames -- indices of the frames to predict
+    pad, causal_shift -- input padding, as for UnchunkedGenerator
+    batch_size -- number of target frames predicted at once (bounds the memory usage)
+    device -- device on which the inputs are copied (optional)
+    augment -- test-time augmentation (average with the prediction of the mirrored input)
+    kps_left and kps_right -- list of left/right 2D keypoints if flipping is enabled
+    joints_left and joints_right -- list of left/right 3D joints if flipping is enabled
+                                    (None for the trajectory model)
+    max_density -- fraction of the dense computation above which the dense evaluation is used
+                   (the gathered convolutions move more memory than the dense ones, so they must save enough)
+
+    Returns a NumPy array of shape (len(frames), num_joints_out, 3).
+    """
+    receptive_field = 2*pad + 1
+    frames, order = np.unique(np.asarray(frames, dtype=np.int64), return_inverse=True)
+    assert np.all((frames >= 0) & (frames < poses_2d.shape[0])), 'Frame index out of range'
+    if len(frames) == 0:
+        return np.empty((0, getattr(model, 'num_joints_out', 0), 3), dtype='float32')
+    # Output frame t depends on the padded input frames [t, t + receptive_field)
+    padded = np.pad(poses_2d, ((pad + causal_shift, pad - causal_shift), (0, 0), (0, 0)), 'edge').astype('float32')
+    sparse = _supports_sparse(model)
+
+    outputs = []
+    with torch.no_grad():
+        model.eval()
+        for start in range(0, len(frames), batch_size):
+            targets = frames[start : start + batch_size]
+            first = targets[0]
+            window = padded[first : targets[-1] + receptive_field]
+            targets = targets - first
+            plan = None
+            if sparse:
+                plan = _keyframe_plan(model, targets)
+                if _plan_density(model, plan, window.shape[0]) > max_density:
+                    plan = None
+                else:
+                    window = window[plan[0]]
+
+            batch_2d = window[None]
+            if augment:
+                flipped = batch_2d.copy()
+                flipped[:, :, :, 0] *= -1
+                flipped[:, :, kps_left + kps_right] = flipped[:, :, kps_right + kps_left]
+                batch_2d = np.concatenate((batch_2d, flipped), axis=0)
+
+            inputs_2d = torch.from_numpy(batch_2d)
+            if device is not None:
+                inputs_2d = inputs_2d.to(device)
+            if plan is not None:
+                x = inputs_2d.view(inputs_2d.shape[0], inputs_2d.shape[1], -1).permute(0, 2, 1)
+                predicted_3d_pos = _sparse_forward(model, x, plan)
+            else:
+                predicted_3d_pos = model(inputs_2d)[:, torch.as_tensor(targets, device=inputs_2d.device)]
+
+            if augment:
+                # Undo flipping and take average with non-flipped version
+                flipped = predicted_3d_pos[1:]
+                flipped[:, :, :, 0] *= -1
+                if joints_left is not None:
+                    flipped[:, :, joints_left + joints_right] = flipped[:, :, joints_right + joints_left]
+                predicted_3d_pos = (predicted_3d_pos[:1] + flipped) / 2
+            outputs.append(predicted_3d_pos[0].cpu().numpy())
+    return np.concatenate(outputs, axis=0)[order]
+
+class Lifter:
+    """
+    Inference-only 2D-to-3D lifting with a pretrained model, which is loaded once and
+    can then be used for any number of sequences. The sequences given to predict() are packed
+    and evaluated together (see PackedGenerator), and if the checkpoint contains a trajectory
+    model, it is evaluated in the same pass as the pose model (see TemporalModelPosTraj).
+
+    Arguments:
+    model_pos -- pose model (TemporalModel)
+    model_traj -- trajectory model (optional). If given, the predictions are absolute positions
+                  in camera space, otherwise they are relative to the root joint
+    causal -- the models use causal convolutions
+    augment -- test-time augmentation (average with the prediction of the mirrored input)
+    kps_left and kps_right -- list of left/right 2D keypoints if flipping is enabled
+    joints_left and joints_right -- list of left/right 3D joints if flipping is enabled
+    max_frames and batch_size -- packing of the sequences (see PackedGenerator)
+    device -- device on which the models are evaluated (default: CUDA if available)
+    """
+    def __init__(self, model_pos, model_traj=None, causal=False, augment=True,
+                 kps_left=None, kps_right=None, joints_left=None, joints_right=None,
+                 max_frames=8192, batch_size=8, device=None):
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device = torch.device(device)
+        self.augment = augment
+        self.kps_left = kps_left
+        self.kps_right = kps_right
+        self.joints_left = joints_left
+        self.joints_right = joints_right
+        self.max_frames = max_frames
+        self.batch_size = batch_size
+
+        receptive_field = model_pos.receptive_field()
+        self.pad = (receptive_field - 1) // 2 # Padding on each side
+        self.causal_shift = self.pad if causal else 0
+
+        self.model_pos = model_pos.to(self.device).eval()
+        self.model_traj = None if model_traj is None else model_traj.to(self.device).eval()
+        self.model_pos_traj = None
+        if model_traj is not None and TemporalModelPosTraj.supports(model_pos, model_traj):
+            # Predict poses and trajectory in a single pass
+            self.model_pos_traj = TemporalModelPosTraj(self.model_pos, self.model_traj)
+
+    @classmethod
+    def from_checkpoint(cls, path, num_joints_in, in_features, num_joints_out, filter_widths,
+                        causal=False, channels=1024, dense=False, **kwargs):
+        """
+        Build the models with the given architecture and load their weights from a checkpoint
+        (the trajectory model is used if the checkpoint contains one).
+        The other keyword arguments are passed to the constructor.
+        """
+        checkpoint = torch.load(path, map_location=lambda storage, loc: storage)
+        model_pos = TemporalModel(num_joints_in, in_features, num_joints_out,
+                                  filter_widths=filter_widths, causal=causal, channels=channels, dense=dense,
+                                  inner_channels=checkpoint.get('inner_channels'))
+        model_pos.load_state_dict(checkpoint['model_pos'])
+        model_traj = None
+        if 'model_traj' in checkpoint:
+            model_traj = TemporalModel(num_joints_in, in_features, 1,
+                                       filter_widths=filter_widths, causal=causal, channels=channels, dense=dense)
+            model_traj.load_state_dict(checkpoint['model_traj'])
+        return cls(model_pos, model_traj, causal=causal, **kwargs)
+
+    def receptive_field(self):
+        return self.model_pos.receptive_field()
+
+    def predict(self, poses_2d, kps_left=None, kps_right=None):
+        """
+        Predict the 3D poses (camera space) of a list of 2D keypoint sequences (normalized
+        screen coordinates), and return a list of NumPy arrays in the same order.
+        The left/right 2D keypoints default to the ones given to the constructor.
+        """
+        if len(poses_2d) == 0:
+            return []
+        gen = PackedGenerator(poses_2d, max_frames=self.max_frames, batch_size=self.batch_size,
+                              pad=self.pad, causal_shift=self.causal_shift, augment=self.augment,
+                              kps_left=self.kps_left if kps_left is None else kps_left,
+                              kps_right=self.kps_right if kps_right is None else kps_right)
+        if self.model_pos_traj is not None:
+            return packed_predict(self.model_pos_traj, gen, self.joints_left, self.joints_right, self.device)
+        predictions = packed_predict(self.model_pos, gen, self.joints_left, self.joints_right, self.device)
+        if self.model_traj is not None:
+            predictions_traj = packed_predict(self.model_traj, gen, device=self.device)
+            predictions = [p + t for p, t in zip(predictions, predictions_traj)]
+        return predictions
@@ -8,6 +8,21 @@
 import numpy as np
 from common.skeleton import Skeleton
 
+def select_data(data, subjects=None, actions=None):
+    """
+    Return the part of a nested dataset dictionary (subject -> action -> data) that belongs
+    to the given subjects and to the actions starting with one of the given names (default: all).
+    """
+    if subjects is None and actions is None:
+        return data
+    selected = {}
+    for subject, subject_actions in data.items():
+        if subjects is not None and subject not in subjects:
+            continue
+        selected[subject] = {action: value for action, value in subject_actions.items()
+                             if actions is None or any(action.startswith(a) for a in actions)}
+    return selected
+
 class MocapDataset:
     def __init__(self, fps, skeleton):
         self._skeleton = skeleton
@@ -26,6 +41,13 @@ class MocapDataset:
         
     def __getitem__(self, key):
         return self._data[key]
+    
+    def add_action(self, subject, action):
+        """
+        Return the data of an action of a subject, which is added (with the cameras of the subject)
+        if it is missing, e.g. to fill a dataset that was loaded without its positions.
+        """
+        return self._data.setdefault(subject, {}).setdefault(action, {'cameras': self._cameras[subject]})
         
     def subjects(self):
         return self._data.keys()
@@ -5,6 +5,9 @@
 # LICENSE file in the root directory of this source tree.
 #
 
+import copy
+
+import torch
 import torch.nn as nn
 
 class TemporalModelBase(nn.Module):
@@ -83,7 +86,7 @@ class TemporalModel(TemporalModelBase):
     """
     
     def __init__(self, num_joints_in, in_features, num_joints_out,
-                 filter_widths, causal=False, dropout=0.25, channels=1024, dense=False):
+                 filter_widths, causal=False, dropout=0.25, channels=1024, dense=False, inner_channels=None):
         """
         Initialize this model.
         
@@ -96,6 +99,7 @@ class TemporalModel(TemporalModelBase):
         dropout -- dropout probability
         channels -- number of convolution channels
         dense -- use regular dense convolutions instead of dilated convolutions (ablation experiment)
+        inner_channels -- number of channels inside each residual block (optional, e.g. for pruned models)
         """
         super().__init__(num_joints_in, in_features, num_joints_out, filter_widths, causal, dropout, channels)
         
@@ -110,12 +114,13 @@ class TemporalModel(TemporalModelBase):
             self.pad.append((filter_widths[i] - 1)*next_dilation // 2)
             self.causal_shift.append((filter_widths[i]//2 * next_dilation) if causal else 0)
             
-            layers_conv.append(nn.Conv1d(channels, channels,
+            block_channels = channels if inner_channels is None else inner_channels[i-1]
+            layers_conv.append(nn.Conv1d(channels, block_channels,
                                          filter_widths[i] if not dense else (2*self.pad[-1] + 1),
                                          dilation=next_dilation if not dense else 1,
                                          bias=False))
-            layers_bn.append(nn.BatchNorm1d(channels, momentum=0.1))
-            layers_conv.append(nn.Conv1d(channels, channels, 1, dilation=1, bias=False))
+            layers_bn.append(nn.BatchNorm1d(block_channels, momentum=0.1))
+            layers_conv.append(nn.Conv1d(block_channels, channels, 1, dilation=1, bias=False))
             layers_bn.append(nn.BatchNorm1d(channels, momentum=0.1))
             
             next_dilation *= filter_widths[i]
@@ -149,7 +154,7 @@ class TemporalModelOptimized1f(TemporalModelBase):
     """
     
     def __init__(self, num_joints_in, in_features, num_joints_out,
-                 filter_widths, causal=False, dropout=0.25, channels=1024):
+                 filter_widths, causal=False, dropout=0.25, channels=1024, inner_channels=None):
         """
         Initialize this model.
         
@@ -161,6 +166,7 @@ class TemporalModelOptimized1f(TemporalModelBase):
         causal -- use causal convolutions instead of symmetric convolutions (for real-time applications)
         dropout -- dropout probability
         channels -- number of convolution channels
+        inner_channels -- number of channels inside each residual block (optional, e.g. for pruned models)
         """
         super().__init__(num_joints_in, in_features, num_joints_out, filter_widths, causal, dropout, channels)
         
@@ -175,9 +181,10 @@ class TemporalModelOptimized1f(TemporalModelBase):
             self.pad.append((filter_widths[i] - 1)*next_dilation // 2)
             self.causal_shift.append((filter_widths[i]//2) if causal else 0)
             
-            layers_conv.append(nn.Conv1d(channels, channels, filter_widths[i], stride=filter_widths[i], bias=False))
-            layers_bn.append(nn.BatchNorm1d(channels, momentum=0.1))
-            layers_conv.append(nn.Conv1d(channels, channels, 1, dilation=1, bias=False))
+            block_channels = channels if inner_channels is None else inner_channels[i-1]
+            layers_conv.append(nn.Conv1d(channels, block_channels, filter_widths[i], stride=filter_widths[i], bias=False))
+            layers_bn.append(nn.BatchNorm1d(block_channels, momentum=0.1))
+            layers_conv.append(nn.Conv1d(block_channels, channels, 1, dilation=1, bias=False))
             layers_bn.append(nn.BatchNorm1d(channels, momentum=0.1))
             next_dilation *= filter_widths[i]
             
@@ -194,4 +201,120 @@ class TemporalModelOptimized1f(TemporalModelBase):
             x = res + self.drop(self.relu(self.layers_bn[2*i + 1](self.layers_conv[2*i + 1](x))))
         
         x = self.shrink(x)
-        return x
\ No newline at end of file
+        return x
+
+class TemporalModelPosTraj(nn.Module):
+    """
+    Inference-only combination of a pose model and a trajectory model with the same architecture,
+    which evaluates both networks in a single pass over the same input.
+    
+    The two networks are stacked along the channel axis: the first layer is a single convolution
+    with the output channels of both models, and all subsequent layers are grouped convolutions
+    (groups=2), so that the two networks do not interact. The result is the same as running
+    the two models separately.
+    
+    forward() returns the sum of the pose and trajectory predictions (i.e. absolute positions in camera space),
+    which can be mirrored for test-time augmentation exactly like the output of the pose model.
+    forward_split() returns the two predictions separately.
+    """
+    
+    def __init__(self, model_pos, model_traj):
+        """
+        Initialize this model. Weights are copied from the given models, which are left untouched.
+        
+        Arguments:
+        model_pos -- pose model (TemporalModel)
+        model_traj -- trajectory model (TemporalModel with a single output joint)
+        """
+        super().__init__()
+        assert TemporalModelPosTraj.supports(model_pos, model_traj)
+        
+        self.num_joints_in = model_pos.num_joints_in
+        self.in_features = model_pos.in_features
+        self.num_joints_out = model_pos.num_joints_out
+        self.filter_widths = model_pos.filter_widths
+        self.pad = list(model_pos.pad)
+        self.causal_shift = list(model_pos.causal_shift)
+        self.channels = model_pos.expand_conv.out_channels
+        self.relu = nn.ReLU(inplace=True)
+        
+        self.expand_conv = self._merge_conv(model_pos.expand_conv, model_traj.expand_conv, groups=1)
+        self.expand_bn = self._merge_bn(model_pos.expand_bn, model_traj.expand_bn)
+        self.layers_conv = nn.ModuleList([self._merge_conv(a, b, groups=2)
+                                          for a, b in zip(model_pos.layers_conv, model_traj.layers_conv)])
+        self.layers_bn = nn.ModuleList([self._merge_bn(a, b)
+                                        for a, b in zip(model_pos.layers_bn, model_traj.layers_bn)])
+        self.shrink_pos = copy.deepcopy(model_pos.shrink)
+        self.shrink_traj = copy.deepcopy(model_traj.shrink)
+        self.to(model_pos.shrink.weight.device)
+        self.eval()
+        
+    @staticmethod
+    def supports(model_pos, model_traj):
+        """
+        Return True if the two models can be combined (same architecture and channels).
+        """
+        if not isinstance(model_pos, TemporalModel) or not isinstance(model_traj, TemporalModel):
+            return False
+        shapes_pos = [conv.weight.shape for conv in model_pos.layers_conv]
+        shapes_traj = [conv.weight.shape for conv in model_traj.layers_conv]
+        return model_pos.filter_widths == model_traj.filter_widths \
+            and model_pos.causal_shift == model_traj.causal_shift \
+            and model_pos.expand_conv.weight.shape == model_traj.expand_conv.weight.shape \
+            and shapes_pos == shapes_traj \
+            and type(model_pos.expand_bn) == type(model_traj.expand_bn) \
+            and (model_pos.expand_conv.bias is None) == (model_traj.expand_conv.bias is None)
+    
+    @staticmethod
+    def _merge_conv(conv_a, conv_b, groups):
+        merged = nn.Conv1d(conv_a.in_channels * groups, conv_a.out_channels * 2, conv_a.kernel_size,
+                           stride=conv_a.stride, dilation=conv_a.dilation, groups=groups,
+                           bias=conv_a.bias is not None)
+        with torch.no_grad():
+            merged.weight.copy_(torch.cat((conv_a.weight, conv_b.weight), dim=0))
+            if conv_a.bias is not None:
+                merged.bias.copy_(torch.cat((conv_a.bias, conv_b.bias), dim=0))
+        return merged
+    
+    @staticmethod
+    def _merge_bn(bn_a, bn_b):
+        if not isinstance(bn_a, nn.BatchNorm1d):
+            # Batch normalization has been folded into the convolutions
+            return nn.Identity()
+        merged = nn.BatchNorm1d(bn_a.num_features * 2, eps=bn_a.eps, affine=bn_a.affine)
+        with torch.no_grad():
+            merged.running_mean.copy_(torch.cat((bn_a.running_mean, bn_b.running_mean)))
+            merged.running_var.copy_(torch.cat((bn_a.running_var, bn_b.running_var)))
+            if bn_a.affine:
+                merged.weight.copy_(torch.cat((bn_a.weight, bn_b.weight)))
+                merged.bias.copy_(torch.cat((bn_a.bias, bn_b.bias)))
+        return merged
+    
+    receptive_field = TemporalModelBase.receptive_field
+    total_causal_shift = TemporalModelBase.total_causal_shift
+    
+    def forward_split(self, x):
+        assert len(x.shape) == 4
+        assert x.shape[-2] == self.num_joints_in
+        assert x.shape[-1] == self.in_features
+        
+        sz = x.shape[:3]
+        x = x.view(x.shape[0], x.shape[1], -1)
+        x = x.permute(0, 2, 1)
+        
+        x = self.relu(self.expand_bn(self.expand_conv(x)))
+        for i in range(len(self.pad) - 1):
+            pad = self.pad[i+1]
+            shift = self.causal_shift[i+1]
+            res = x[:, :, pad + shift : x.shape[2] - pad + shift]
+            
+            x = self.relu(self.layers_bn[2*i](self.layers_conv[2*i](x)))
+            x = res + self.relu(self.layers_bn[2*i + 1](self.layers_conv[2*i + 1](x)))
+        
+        pos = self.shrink_pos(x[:, :self.channels]).permute(0, 2, 1)
+        traj = self.shrink_traj(x[:, self.channels:]).permute(0, 2, 1)
+        return pos.reshape(sz[0], -1, self.num_joints_out, 3), traj.reshape(sz[0], -1, 1, 3)
+    
+    def forward(self, x):
+        pos, traj = self.forward_split(x)
+        return pos + traj
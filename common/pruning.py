@@ -0,0 +1,103 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import copy
+
+import numpy as np
+import torch
+
+def num_blocks(state_dict):
+    """
+    Return the number of residual blocks of a temporal model, given its weights.
+    """
+    count = 0
+    while 'layers_conv.{}.weight'.format(2*count) in state_dict:
+        count += 1
+    return count
+
+def inner_channels(state_dict):
+    """
+    Return the number of channels inside each residual block, given the weights of a temporal model.
+    """
+    return [state_dict['layers_conv.{}.weight'.format(2*i)].shape[0] for i in range(num_blocks(state_dict))]
+
+def count_flops(state_dict, block_channels=None):
+    """
+    Return the number of multiply-accumulate operations per output frame of a temporal model
+    (for sequence inference, where each layer computes one output column per frame).
+
+    Arguments:
+    state_dict -- weights of the model (TemporalModel or TemporalModelOptimized1f)
+    block_channels -- number of channels inside each residual block (default: taken from the weights)
+    """
+    if block_channels is None:
+        block_channels = inner_channels(state_dict)
+    channels, in_channels, kernel_size = state_dict['expand_conv.weight'].shape
+    flops = channels * in_channels * kernel_size
+    for i, inner in enumerate(block_channels):
+        kernel_size = state_dict['layers_conv.{}.weight'.format(2*i)].shape[2]
+        flops += inner * channels * kernel_size # Dilated convolution
+        flops += inner * channels # 1x1 convolution
+    flops += state_dict['shrink.weight'].shape[0] * channels
+    return flops
+
+def select_channels(state_dict, target_flops, min_channels=8, channel_multiple=8):
+    """
+    Rank the channels inside each residual block by the magnitude of the corresponding
+    batch normalization scale (gamma), and remove the least important ones (globally
+    across blocks) until the model fits the FLOP budget.
+    Channels on the residual path are not pruned, since they are shared by all blocks.
+
+    Arguments:
+    state_dict -- weights of the model
+    target_flops -- FLOP budget per output frame (see count_flops)
+    min_channels -- minimum number of channels to keep in each block
+    channel_multiple -- round the number of kept channels up to a multiple of this value
+
+    Returns a list with the (sorted) indices of the channels to keep in each block.
+    """
+    blocks = num_blocks(state_dict)
+    scores = [np.abs(state_dict['layers_bn.{}.weight'.format(2*i)].cpu().numpy()) for i in range(blocks)]
+    order = [np.argsort(-score, kind='stable') for score in scores] # Most important first
+    kept = [len(score) for score in scores]
+
+    # Candidates for removal, from the least important to the most important
+    candidates = sorted((score[c], i, c) for i, score in enumerate(scores) for c in range(len(score)))
+    for _, i, _ in candidates:
+        if count_flops(state_dict, kept) <= target_flops:
+            break
+        if kept[i] > min_channels:
+            kept[i] -= 1
+
+    keep = []
+    for i in range(blocks):
+        n = min(len(scores[i]), int(np.ceil(kept[i] / channel_multiple)) * channel_multiple)
+        keep.append(np.sort(order[i][:n]))
+    return keep
+
+def prune_state_dict(state_dict, keep):
+    """
+    Physically remove channels inside the residual blocks of a temporal model.
+
+    Arguments:
+    state_dict -- weights of the model (left untouched)
+    keep -- list with the indices of the channels to keep in each block (see select_channels)
+
+    Returns the pruned weights, which can be loaded into a model built with
+    inner_channels=[len(k) for k in keep].
+    """
+    pruned = copy.copy(state_dict)
+    for i, indices in enumerate(keep):
+        indices = torch.as_tensor(indices, dtype=torch.long)
+        conv_in = 'layers_conv.{}.weight'.format(2*i)
+        conv_out = 'layers_conv.{}.weight'.format(2*i + 1)
+        pruned[conv_in] = state_dict[conv_in][indices].clone()
+        pruned[conv_out] = state_dict[conv_out][:, indices].clone()
+        for param in ['weight', 'bias', 'running_mean', 'running_var']:
+            key = 'layers_bn.{}.{}'.format(2*i, param)
+            pruned[key] = state_dict[key][indices].clone()
+    return pruned
@@ -0,0 +1,136 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+try:
+    import torch.ao.quantization as quantization
+    from torch.ao.nn.quantized import FloatFunctional
+except ImportError:
+    # Older versions of PyTorch
+    import torch.quantization as quantization
+    from torch.nn.quantized import FloatFunctional
+
+from common.camera import normalize_screen_coordinates
+from common.fusion import fuse_model
+from common.model import TemporalModelBase
+
+class QuantizableTemporalModel(nn.Module):
+    """
+    Copy of a TemporalModel that supports post-training static quantization (eager mode).
+    Batch normalization is folded into the convolutions, and each convolution is
+    fused with the following ReLU. Quantized models only run on the CPU: inputs are moved
+    to the CPU and outputs are moved back to the device of the inputs.
+
+    Arguments:
+    model -- the TemporalModel to copy (the original model is left untouched)
+    """
+
+    receptive_field = TemporalModelBase.receptive_field
+    total_causal_shift = TemporalModelBase.total_causal_shift
+
+    def __init__(self, model):
+        super().__init__()
+        fused = fuse_model(model).cpu()
+
+        self.num_joints_in = fused.num_joints_in
+        self.in_features = fused.in_features
+        self.num_joints_out = fused.num_joints_out
+        self.filter_widths = fused.filter_widths
+        self.pad = list(fused.pad)
+        self.causal_shift = list(fused.causal_shift)
+
+        self.quant = quantization.QuantStub()
+        self.dequant = quantization.DeQuantStub()
+        self.expand_conv = fused.expand_conv
+        self.expand_relu = nn.ReLU()
+        self.layers_conv = fused.layers_conv
+        self.layers_relu = nn.ModuleList([nn.ReLU() for _ in fused.layers_conv])
+        self.layers_add = nn.ModuleList([FloatFunctional() for _ in range(len(self.pad) - 1)])
+        self.shrink = fused.shrink
+
+    def fuse(self):
+        modules = [['expand_conv', 'expand_relu']]
+        for i in range(len(self.layers_conv)):
+            modules.append(['layers_conv.' + str(i), 'layers_relu.' + str(i)])
+        quantization.fuse_modules(self, modules, inplace=True)
+
+    def forward(self, x):
+        assert len(x.shape) == 4
+        assert x.shape[-2] == self.num_joints_in
+        assert x.shape[-1] == self.in_features
+
+        device = x.device
+        sz = x.shape[:3]
+        x = x.cpu().reshape(x.shape[0], x.shape[1], -1)
+        x = x.permute(0, 2, 1).contiguous()
+
+        x = self.quant(x)
+        x = self.expand_relu(self.expand_conv(x))
+        for i in range(len(self.pad) - 1):
+            pad = self.pad[i+1]
+            shift = self.causal_shift[i+1]
+            res = x[:, :, pad + shift : x.shape[2] - pad + shift]
+
+            x = self.layers_relu[2*i](self.layers_conv[2*i](x))
+            x = self.layers_add[i].add(res, self.layers_relu[2*i + 1](self.layers_conv[2*i + 1](x)))
+        x = self.dequant(self.shrink(x))
+
+        x = x.permute(0, 2, 1)
+        x = x.reshape(sz[0], -1, self.num_joints_out, 3)
+        return x.to(device)
+
+def quantize_model(model, calibration_inputs, backend='fbgemm'):
+    """
+    Quantize a TemporalModel to int8 (weights and activations) using post-training static quantization.
+
+    Arguments:
+    model -- the TemporalModel to quantize (the original model is left untouched)
+    calibration_inputs -- iterable of padded 2D input tensors, used to calibrate the activation ranges
+    backend -- quantized engine ('fbgemm' for x86, 'qnnpack' for ARM)
+    """
+    torch.backends.quantized.engine = backend
+    qmodel = QuantizableTemporalModel(model).eval()
+    qmodel.fuse()
+    qmodel.qconfig = quantization.get_default_qconfig(backend)
+    quantization.prepare(qmodel, inplace=True)
+    with torch.no_grad():
+        for inputs in calibration_inputs:
+            qmodel(inputs)
+    quantization.convert(qmodel, inplace=True)
+    return qmodel
+
+def load_calibration_inputs(detections_path, pad, causal_shift, max_frames=10000):
+    """
+    Load a sample of 2D keypoints from a custom dataset (as created by prepare_data_2d_custom.py),
+    and return a list of padded input tensors for quantize_model().
+
+    Arguments:
+    detections_path -- path to the .npz archive of the custom dataset
+    pad, causal_shift -- input padding, as for UnchunkedGenerator
+    max_frames -- maximum number of frames to sample (sequences are taken in order until the budget is reached)
+    """
+    data = np.load(detections_path, allow_pickle=True)
+    resolutions = data['metadata'].item()['video_metadata']
+    keypoints = data['positions_2d'].item()
+
+    inputs = []
+    frames = 0
+    for video_name, actions in keypoints.items():
+        res = resolutions[video_name]
+        for sequences in actions.values():
+            for kps in sequences:
+                if frames >= max_frames:
+                    return inputs
+                kps = kps[:max_frames - frames, :, :2]
+                frames += kps.shape[0]
+                kps = normalize_screen_coordinates(kps, w=res['w'], h=res['h']).astype('float32')
+                kps = np.pad(kps, ((pad + causal_shift, pad - causal_shift), (0, 0), (0, 0)), 'edge')
+                inputs.append(torch.from_numpy(np.expand_dims(kps, axis=0)))
+    return inputs
@@ -5,7 +5,9 @@
 # LICENSE file in the root directory of this source tree.
 #
 
-import torch
+import numpy as np
+
+from common.utils import is_tensor
 
 def qrot(q, v):
     """
@@ -13,14 +15,20 @@ def qrot(q, v):
     Expects a tensor of shape (*, 4) for q and a tensor of shape (*, 3) for v,
     where * denotes any number of dimensions.
     Returns a tensor of shape (*, 3).
+    q and v must be both NumPy arrays or both PyTorch tensors (the result has the same type).
     """
     assert q.shape[-1] == 4
     assert v.shape[-1] == 3
     assert q.shape[:-1] == v.shape[:-1]
 
     qvec = q[..., 1:]
-    uv = torch.cross(qvec, v, dim=len(q.shape)-1)
-    uuv = torch.cross(qvec, uv, dim=len(q.shape)-1)
+    if is_tensor(q):
+        import torch
+        uv = torch.cross(qvec, v, dim=len(q.shape)-1)
+        uuv = torch.cross(qvec, uv, dim=len(q.shape)-1)
+    else:
+        uv = np.cross(qvec, v)
+        uuv = np.cross(qvec, uv)
     return (v + 2 * (q[..., :1] * uv + uuv))
     
     
@@ -32,4 +40,7 @@ def qinverse(q, inplace=False):
     else:
         w = q[..., :1]
         xyz = q[..., 1:]
-        return torch.cat((w, -xyz), dim=len(q.shape)-1)
\ No newline at end of file
+        if is_tensor(q):
+            import torch
+            return torch.cat((w, -xyz), dim=len(q.shape)-1)
+        return np.concatenate((w, -xyz), axis=len(q.shape)-1)
@@ -0,0 +1,107 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import torch
+import torch.nn.functional as F
+
+from common.model import TemporalModel
+
+class StreamingTemporalModel:
+    """
+    Frame-by-frame inference wrapper for a causal TemporalModel.
+
+    Each layer keeps a ring buffer with the past activations that its dilated convolution
+    needs, so that feeding a new 2D frame only computes one output column per layer
+    (instead of re-running the whole receptive field). The 3D pose returned for each frame
+    matches the output of the batch model on a sequence padded by UnchunkedGenerator.
+
+    The first frame of a stream is replicated to fill the history, which reproduces
+    the 'edge' padding used by the generators.
+
+    Arguments:
+    model -- a TemporalModel built with causal=True (weights are shared, not copied)
+    """
+
+    def __init__(self, model):
+        assert isinstance(model, TemporalModel), 'Only TemporalModel is supported'
+        assert model.total_causal_shift() == (model.receptive_field() - 1) // 2, \
+            'Streaming inference requires causal convolutions'
+
+        self.model = model
+
+        convs = [model.expand_conv] + [model.layers_conv[2*i] for i in range(len(model.pad) - 1)]
+        self._taps = []
+        for conv in convs:
+            kernel_size = conv.kernel_size[0]
+            dilation = conv.dilation[0]
+            length = (kernel_size - 1)*dilation + 1
+            # For each write position, the buffer indices of the taps, from the oldest to the newest frame
+            self._taps.append([torch.tensor([(pos + 1 + j*dilation) % length for j in range(kernel_size)])
+                               for pos in range(length)])
+        self.reset()
+
+    def reset(self):
+        """
+        Discard the history, so that the next frame starts a new stream.
+        """
+        self._buffers = [None] * len(self._taps)
+        self._positions = [0] * len(self._taps)
+
+    def _push(self, layer, column):
+        buf = self._buffers[layer]
+        taps = self._taps[layer]
+        if buf is None:
+            # Fill the history with the first column (equivalent to edge padding)
+            buf = column.unsqueeze(2).repeat(1, 1, len(taps))
+            self._buffers[layer] = buf
+            pos = len(taps) - 1
+        else:
+            pos = (self._positions[layer] + 1) % len(taps)
+            buf[:, :, pos] = column
+        self._positions[layer] = pos
+        return buf[:, :, taps[pos].to(buf.device)]
+
+    def _conv(self, conv, window):
+        return F.conv1d(window, conv.weight, conv.bias)
+
+    def step(self, frame):
+        """
+        Process a new 2D frame and return the 3D pose for this frame.
+
+        Arguments:
+        frame -- 2D keypoints of shape (N, num_joints_in, in_features), one element per stream
+
+        Returns a tensor of shape (N, num_joints_out, 3).
+        """
+        model = self.model
+        assert not model.training, 'Streaming inference requires the model to be in evaluation mode'
+        assert len(frame.shape) == 3
+        assert frame.shape[-2] == model.num_joints_in
+        assert frame.shape[-1] == model.in_features
+
+        with torch.no_grad():
+            window = self._push(0, frame.reshape(frame.shape[0], -1))
+            x = model.relu(model.expand_bn(self._conv(model.expand_conv, window)))[:, :, 0]
+
+            for i in range(len(model.pad) - 1):
+                # With causal convolutions, the residual is the most recent frame of the window
+                res = x
+                window = self._push(i + 1, x)
+                x = model.relu(model.layers_bn[2*i](self._conv(model.layers_conv[2*i], window)))
+                x = res + model.relu(model.layers_bn[2*i + 1](model.layers_conv[2*i + 1](x)))[:, :, 0]
+
+            x = model.shrink(x.unsqueeze(2))
+        return x.view(frame.shape[0], model.num_joints_out, 3)
+
+    def __call__(self, frames):
+        """
+        Convenience method to feed a whole (unpadded) sequence of shape (N, T, num_joints_in, in_features)
+        one frame at a time. Returns a tensor of shape (N, T, num_joints_out, 3).
+        The history is preserved across calls; use reset() to start a new stream.
+        """
+        outputs = [self.step(frames[:, t]) for t in range(frames.shape[1])]
+        return torch.stack(outputs, dim=1)
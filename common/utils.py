@@ -5,36 +5,51 @@
 # LICENSE file in the root directory of this source tree.
 #
 
-import torch
+import sys
 import numpy as np
 import hashlib
 
+def is_tensor(x):
+    """
+    Return True if x is a PyTorch tensor. This does not import torch, so that NumPy-only code
+    does not depend on it (if torch has not been imported, x cannot be a tensor).
+    """
+    torch = sys.modules.get('torch')
+    return torch is not None and isinstance(x, torch.Tensor)
+
 def wrap(func, *args, unsqueeze=False):
     """
     Wrap a torch function so it can be called with NumPy arrays.
-    Input and return types are seamlessly converted.
+    Input and return types are seamlessly converted (without copies, the tensors share the memory
+    of the arrays). Tensors are passed through unchanged, and if no argument is a NumPy array,
+    the result is returned as is, so that data can stay in torch across calls.
     """
+    import torch
     
     # Convert input types where applicable
     args = list(args)
+    convert = False
     for i, arg in enumerate(args):
-        if type(arg) == np.ndarray:
+        if isinstance(arg, np.ndarray):
+            convert = True
             args[i] = torch.from_numpy(arg)
             if unsqueeze:
                 args[i] = args[i].unsqueeze(0)
         
     result = func(*args)
+    if not convert:
+        return result
     
     # Convert output types where applicable
     if isinstance(result, tuple):
         result = list(result)
         for i, res in enumerate(result):
-            if type(res) == torch.Tensor:
+            if isinstance(res, torch.Tensor):
                 if unsqueeze:
                     res = res.squeeze(0)
                 result[i] = res.numpy()
         return tuple(result)
-    elif type(result) == torch.Tensor:
+    elif isinstance(result, torch.Tensor):
         if unsqueeze:
             result = result.squeeze(0)
         return result.numpy()
@@ -0,0 +1,84 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import argparse
+import os
+import numpy as np
+
+import sys
+sys.path.append('../')
+from common.camera import normalize_screen_coordinates
+from common.columnar import write_store, is_store
+
+def camera_resolution(dataset, metadata, subject, cam_idx):
+    if dataset == 'h36m':
+        from common.h36m_dataset import h36m_cameras_intrinsic_params
+        cam = h36m_cameras_intrinsic_params[cam_idx]
+        return cam['res_w'], cam['res_h']
+    elif dataset.startswith('humaneva'):
+        from common.humaneva_dataset import humaneva_cameras_intrinsic_params
+        cam = humaneva_cameras_intrinsic_params[cam_idx]
+        return cam['res_w'], cam['res_h']
+    elif dataset.startswith('custom'):
+        res = metadata['video_metadata'][subject]
+        return res['w'], res['h']
+    else:
+        raise KeyError('Invalid dataset')
+
+if __name__ == '__main__':
+    if os.path.basename(os.getcwd()) != 'data':
+        print('This script must be launched from the "data" directory')
+        exit(0)
+
+    parser = argparse.ArgumentParser(description='Converter to memory-mapped columnar stores')
+
+    parser.add_argument('-i', '--input', default='', type=str, metavar='PATH',
+                        help='input archive (e.g. data_3d_h36m.npz or data_2d_h36m_cpn_ft_h36m_dbb.npz)')
+    parser.add_argument('-o', '--output', default='', type=str, metavar='PATH',
+                        help='output directory (default: input file name without extension)')
+    parser.add_argument('--normalize', default='', type=str, metavar='NAME',
+                        help='store 2D keypoints in normalized camera coordinates, using the cameras of this dataset '
+                             '(h36m, humaneva15, humaneva20 or custom)')
+
+    args = parser.parse_args()
+
+    if not args.input:
+        print('Please specify the input archive')
+        exit(0)
+
+    output = args.output or os.path.splitext(args.input)[0]
+    if is_store(output):
+        print('The store already exists at', output)
+        exit(0)
+
+    print('Loading', args.input)
+    archive = np.load(args.input, allow_pickle=True)
+    metadata = archive['metadata'].item() if 'metadata' in archive else {}
+    modalities = {}
+    for name in ['positions_3d', 'positions_2d']:
+        if name in archive:
+            modalities[name] = archive[name].item()
+
+    if args.normalize:
+        if 'positions_2d' not in modalities:
+            print('--normalize requires 2D keypoints')
+            exit(0)
+        print('Normalizing 2D keypoints...')
+        for subject, actions in modalities['positions_2d'].items():
+            for action, sequences in actions.items():
+                for cam_idx, kps in enumerate(sequences):
+                    if kps is None:
+                        continue
+                    w, h = camera_resolution(args.normalize, metadata, subject, cam_idx)
+                    kps = kps.copy()
+                    kps[..., :2] = normalize_screen_coordinates(kps[..., :2], w=w, h=h)
+                    sequences[cam_idx] = kps
+        metadata['normalized'] = True
+
+    print('Saving to', output)
+    write_store(output, modalities, metadata)
+    print('Done.')
@@ -1,48 +1,38 @@
 import os
 import glob
-import subprocess
 
-from oss2_uploader import folder_downloader, folder_uploader
+import batch_lift
 
 videos_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "videos")
 
 # iterat over all files in the videos directory, use glob.iglob()
 videos_list = glob.iglob(videos_dir + "/*.avi")
+video_names = [os.path.basename(video_path) for video_path in videos_list]
 
-for video_path in videos_list:
-    video_name = os.path.basename(video_path)
-
-    # use subprocess to run the command
-    subprocess.run(
-        [
-            "python3",
-            "evaludate.py",
-            "-d",
-            "20240322-2086",
-            "-arc",
-            "3,3,3,3,3",
-            "-c",
-            "checkpoint",
-            "--evaluate",
-            "pretrained_h36m_detectron_coco.bin",
-            "--render",
-            "--viz-subject",
-            video_name,
-            "--viz-action",
-            "custom",
-            "--viz-camera",
-            "0",
-            "--viz-video",
-            video_path,
-            "--viz-export",
-            video_name,
-            "--viz-size",
-            "6",
-        ]
-    )
+# lift all the videos in-process, so that torch, the dataset and the checkpoint are only loaded once
+# (the joint positions are exported to results3d/<video_name>.npy, as with evaludate.py --viz-export)
+batch_lift.main(
+    [
+        "-d",
+        "20240322-2086",
+        "-arc",
+        "3,3,3,3,3",
+        "-c",
+        "checkpoint",
+        "--evaluate",
+        "pretrained_h36m_detectron_coco.bin",
+    ]
+    + video_names
+)
 
 
 """
+python3 batch_lift.py -d 20240322-2086 -arc 3,3,3,3,3 
+-c checkpoint --evaluate pretrained_h36m_detectron_coco.bin 
+"Banging Fist-30-0.avi" "Banging Fist-30-1.avi"
+
+equivalent, for a single video, to:
+
 python3 evaludate.py -d 20240322-2086 -arc 3,3,3,3,3 
 -c checkpoint --evaluate pretrained_h36m_detectron_coco.bin 
 --render --viz-subject Banging\ Fist-30-0.avi
@@ -0,0 +1,88 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+# Slim inference entry point: only the standard library is imported at the top, so that parsing
+# the arguments is instant, and the heavy modules (NumPy, torch, the model) are imported on demand.
+# The training, dataset and visualization code is not imported.
+import argparse
+from time import time
+
+start_time = time()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Lift 2D keypoints to 3D poses with a pretrained model')
+    parser.add_argument('-i', '--input', type=str, metavar='PATH', required=True,
+                        help='2D keypoints in the custom dataset layout (see data/prepare_data_2d_custom.py)')
+    parser.add_argument('-m', '--model', default='checkpoint/pretrained_h36m_detectron_coco.bin', type=str,
+                        metavar='PATH', help='checkpoint to use')
+    parser.add_argument('-o', '--output', type=str, metavar='PATH', required=True,
+                        help='output archive with the 3D poses in camera space (same layout as the input)')
+    parser.add_argument('--video', type=str, metavar='NAME', help='only lift this video (default: all)')
+    parser.add_argument('-arc', '--architecture', default='3,3,3,3,3', type=str, metavar='LAYERS',
+                        help='filter widths separated by comma')
+    parser.add_argument('--causal', action='store_true', help='use causal convolutions')
+    parser.add_argument('-ch', '--channels', default=1024, type=int, metavar='N', help='number of channels in convolution layers')
+    parser.add_argument('--dense', action='store_true', help='use dense convolutions instead of dilated convolutions')
+    parser.add_argument('-no-tta', '--no-test-time-augmentation', dest='test_time_augmentation', action='store_false',
+                        help='disable test-time flipping')
+    parser.set_defaults(test_time_augmentation=True)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    import numpy as np
+    from common.camera import normalize_screen_coordinates
+
+    archive = np.load(args.input, allow_pickle=True)
+    metadata = archive['metadata'].item()
+    positions_2d = archive['positions_2d'].item()
+    if args.video is not None:
+        if args.video not in positions_2d:
+            raise KeyError('Video {} is missing from {}'.format(args.video, args.input))
+        positions_2d = {args.video: positions_2d[args.video]}
+
+    keys = []
+    sequences = []
+    for video, actions in positions_2d.items():
+        res = metadata['video_metadata'][video]
+        for action, cameras in actions.items():
+            for kps in cameras:
+                kps = np.array(kps, dtype='float32')
+                kps[..., :2] = normalize_screen_coordinates(kps[..., :2], w=res['w'], h=res['h'])
+                keys.append((video, action))
+                sequences.append(kps)
+    if len(sequences) == 0:
+        print('No sequences to lift')
+        return
+
+    # The 17-joint Human3.6M skeleton, as produced by the datasets with remove_static_joints=True
+    from common.h36m_skeleton import h36m_skeleton_17
+    from common.inference import Lifter
+
+    skeleton = h36m_skeleton_17()
+    kps_left, kps_right = metadata['keypoints_symmetry']
+    lifter = Lifter.from_checkpoint(args.model, sequences[0].shape[-2], sequences[0].shape[-1], skeleton.num_joints(),
+                                    filter_widths=[int(x) for x in args.architecture.split(',')],
+                                    causal=args.causal, channels=args.channels, dense=args.dense,
+                                    augment=args.test_time_augmentation,
+                                    kps_left=list(kps_left), kps_right=list(kps_right),
+                                    joints_left=list(skeleton.joints_left()),
+                                    joints_right=list(skeleton.joints_right()))
+    load_time = time()
+    print('INFO: model loaded in {:.2f} s'.format(load_time - start_time))
+
+    predictions = lifter.predict(sequences)
+    positions_3d = {}
+    for (video, action), prediction in zip(keys, predictions):
+        positions_3d.setdefault(video, {}).setdefault(action, []).append(prediction)
+    np.savez_compressed(args.output, positions_3d=positions_3d)
+    print('INFO: {} sequences, {} frames lifted in {:.2f} s, exported to {}'.format(
+        len(sequences), sum(p.shape[0] for p in predictions), time() - load_time, args.output))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import argparse
+import os
+
+import torch
+
+from common.pruning import count_flops, inner_channels, select_channels, prune_state_dict
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Structured channel pruning for temporal models')
+    parser.add_argument('-c', '--checkpoint', default='checkpoint', type=str, metavar='PATH', help='checkpoint directory')
+    parser.add_argument('-i', '--input', type=str, metavar='FILENAME', required=True, help='checkpoint to prune (file name)')
+    parser.add_argument('-o', '--output', type=str, metavar='FILENAME', required=True, help='pruned checkpoint (file name)')
+    parser.add_argument('-f', '--flops', default=0.5, type=float, metavar='FRACTION',
+                        help='target FLOPs as a fraction of the original model')
+    parser.add_argument('--min-channels', default=8, type=int, metavar='N', help='minimum number of channels per block')
+    parser.add_argument('--channel-multiple', default=8, type=int, metavar='N',
+                        help='round the number of channels per block up to a multiple of N')
+    args = parser.parse_args()
+
+    chk_filename = os.path.join(args.checkpoint, args.input)
+    print('Loading checkpoint', chk_filename)
+    checkpoint = torch.load(chk_filename, map_location=lambda storage, loc: storage)
+    state_dict = checkpoint['model_pos']
+
+    flops = count_flops(state_dict)
+    keep = select_channels(state_dict, args.flops * flops,
+                           min_channels=args.min_channels, channel_multiple=args.channel_multiple)
+    pruned = prune_state_dict(state_dict, keep)
+    pruned_flops = count_flops(pruned)
+
+    print('Channels per block:', inner_channels(state_dict), '->', inner_channels(pruned))
+    print('MACs per frame: {:.1f}M -> {:.1f}M ({:.2f}x fewer)'.format(flops / 1e6, pruned_flops / 1e6, flops / pruned_flops))
+
+    checkpoint['model_pos'] = pruned
+    checkpoint['inner_channels'] = inner_channels(pruned)
+    # The optimizer state refers to the original parameter shapes
+    checkpoint['optimizer'] = None
+
+    out_filename = os.path.join(args.checkpoint, args.output)
+    print('Saving pruned checkpoint to', out_filename)
+    torch.save(checkpoint, out_filename)
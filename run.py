@@ -20,11 +20,50 @@ import errno
 from common.camera import *
 from common.model import *
 from common.loss import *
-from common.generators import ChunkedGenerator, UnchunkedGenerator
+from common.generators import (
+    ChunkedGenerator,
+    UnchunkedGenerator,
+    PackedGenerator,
+    PrefetchGenerator,
+    BucketedGenerator,
+)
+from common.columnar import ColumnarStore, is_store
+from common.inference import windowed_forward, packed_predict, predict_keyframes
 from time import time
 from common.utils import deterministic_random
+from common.mocap_dataset import select_data
 
 args = parse_args()
+
+if args.distributed:
+    # Data-parallel training, one process per rank (launched with torchrun)
+    import torch.distributed as dist
+    from torch.nn.parallel import DistributedDataParallel
+
+    dist.init_process_group(args.dist_backend)
+    rank = dist.get_rank()
+    world_size = dist.get_world_size()
+    if torch.cuda.is_available():
+        torch.cuda.set_device(int(os.environ.get("LOCAL_RANK", 0)))
+    if rank != 0:
+        # Only the first process writes logs, checkpoints and evaluates the model
+        sys.stdout = open(os.devnull, "w")
+else:
+    rank = 0
+    world_size = 1
+
+
+def reduce_sum(*values):
+    """
+    Sum the given numbers over all the processes (when training is distributed).
+    """
+    if world_size == 1:
+        return values
+    values = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(values)
+    return tuple(values.tolist())
+
+
 print(args)
 
 try:
@@ -35,102 +74,196 @@ except OSError as e:
         raise RuntimeError("Unable to create checkpoint directory:", args.checkpoint)
 
 print("Loading dataset...")
-dataset_path = "data/data_3d_" + args.dataset + ".npz"
-if args.dataset == "h36m":
-    from common.h36m_dataset import Human36mDataset
-
-    dataset = Human36mDataset(dataset_path)
-elif args.dataset.startswith("humaneva"):
-    from common.humaneva_dataset import HumanEvaDataset
+data_start_time = time()
+# Datasets are either .npz archives or columnar stores (see data/convert_columnar.py)
+data_ext = "" if args.columnar else ".npz"
+dataset_path = "data/data_3d_" + args.dataset + data_ext
+keypoints_path = "data/data_2d_" + args.dataset + "_" + args.keypoints + data_ext
+# Only the subjects (and actions) that are used are loaded and prepared, so that
+# the time to process a single video does not depend on the size of the dataset
+if "*" in (args.subjects_test, args.subjects_unlabeled):
+    load_subjects = None
+else:
+    load_subjects = [args.viz_subject] if args.render else args.subjects_test.split(",")
+    if not args.evaluate:
+        load_subjects += args.subjects_train.split(",")
+        load_subjects += [s for s in args.subjects_unlabeled.split(",") if s]
+load_actions = None if args.actions == "*" else args.actions.split(",")
+if args.render and args.evaluate:
+    load_actions = [args.viz_action] + (load_actions or [])
+
+
+def load_dataset(load_positions=True):
+    if args.dataset == "h36m":
+        from common.h36m_dataset import Human36mDataset
+
+        return Human36mDataset(
+            dataset_path,
+            subjects=load_subjects,
+            actions=load_actions,
+            load_positions=load_positions,
+        )
+    elif args.dataset.startswith("humaneva"):
+        from common.humaneva_dataset import HumanEvaDataset
+
+        return HumanEvaDataset(
+            dataset_path,
+            subjects=load_subjects,
+            actions=load_actions,
+            load_positions=load_positions,
+        )
+    elif args.dataset.startswith("custom"):
+        from common.custom_dataset import CustomDataset
 
-    dataset = HumanEvaDataset(dataset_path)
-elif args.dataset.startswith("custom"):
-    from common.custom_dataset import CustomDataset
+        # Only the metadata of the 2D detections is read
+        return CustomDataset(keypoints_path, subjects=load_subjects)
+    else:
+        raise KeyError("Invalid dataset")
+
+
+# Prepared data (camera-space 3D poses and normalized 2D keypoints) can be cached on disk.
+# With a cache, the dataset is first loaded without its positions (skeleton and cameras only),
+# and it is only loaded in full if the prepared data is not in the cache.
+dataset = load_dataset(load_positions=not args.data_cache)
+data_cache_path = None
+if args.data_cache:
+    from common.data_cache import (
+        prepared_data_key,
+        save_prepared_data,
+        load_prepared_data,
+    )
 
-    dataset = CustomDataset(
-        "data/data_2d_" + args.dataset + "_" + args.keypoints + ".npz"
+    source_paths = [path for path in (dataset_path, keypoints_path) if os.path.exists(path)]
+    data_cache_path = os.path.join(
+        args.data_cache,
+        prepared_data_key(
+            source_paths,
+            dataset.cameras(),
+            {"subjects": load_subjects, "actions": load_actions},
+            digests_path=os.path.join(args.data_cache, "digests.json"),
+        ),
     )
+data_cache_hit = data_cache_path is not None and is_store(data_cache_path)
+
+if data_cache_hit:
+    print("Loading prepared data from", data_cache_path)
+    keypoints_metadata, keypoints = load_prepared_data(data_cache_path, dataset)
 else:
-    raise KeyError("Invalid dataset")
-
-print("Preparing data...")
-for subject in dataset.subjects():
-    for action in dataset[subject].keys():
-        anim = dataset[subject][action]
-
-        if "positions" in anim:
-            positions_3d = []
-            for cam in anim["cameras"]:
-                pos_3d = world_to_camera(
-                    anim["positions"], R=cam["orientation"], t=cam["translation"]
-                )
-                pos_3d[:, 1:] -= pos_3d[
-                    :, :1
-                ]  # Remove global offset, but keep trajectory in first position
-                positions_3d.append(pos_3d)
-            anim["positions_3d"] = positions_3d
-
-print("Loading 2D detections...")
-keypoints = np.load(
-    "data/data_2d_" + args.dataset + "_" + args.keypoints + ".npz", allow_pickle=True
-)
-keypoints_metadata = keypoints["metadata"].item()
-keypoints_symmetry = keypoints_metadata["keypoints_symmetry"]
-kps_left, kps_right = list(keypoints_symmetry[0]), list(keypoints_symmetry[1])
-joints_left, joints_right = list(dataset.skeleton().joints_left()), list(
-    dataset.skeleton().joints_right()
-)
-keypoints = keypoints["positions_2d"].item()
+    if args.data_cache:
+        dataset = load_dataset()
+    print("Preparing data...")
+    for subject in dataset.subjects():
+        for action in dataset[subject].keys():
+            anim = dataset[subject][action]
 
-for subject in dataset.subjects():
-    assert (
-        subject in keypoints
-    ), "Subject {} is missing from the 2D detections dataset".format(subject)
-    for action in dataset[subject].keys():
-        assert (
-            action in keypoints[subject]
-        ), "Action {} of subject {} is missing from the 2D detections dataset".format(
-            action, subject
+            if "positions" in anim:
+                positions_3d = []
+                for cam in anim["cameras"]:
+                    pos_3d = world_to_camera(
+                        anim["positions"], R=cam["orientation"], t=cam["translation"]
+                    )
+                    pos_3d[:, 1:] -= pos_3d[
+                        :, :1
+                    ]  # Remove global offset, but keep trajectory in first position
+                    positions_3d.append(pos_3d)
+                anim["positions_3d"] = positions_3d
+
+    print("Loading 2D detections...")
+    if args.columnar:
+        keypoints_store = ColumnarStore(keypoints_path)
+        keypoints_metadata = keypoints_store.metadata
+        keypoints = keypoints_store.load("positions_2d", load_subjects, load_actions)
+        # Stores can be created with normalized keypoints (see data/convert_columnar.py)
+        keypoints_normalized = keypoints_metadata.get("normalized", False)
+    else:
+        keypoints = np.load(keypoints_path, allow_pickle=True)
+        keypoints_metadata = keypoints["metadata"].item()
+        keypoints = select_data(
+            keypoints["positions_2d"].item(), load_subjects, load_actions
         )
-        if "positions_3d" not in dataset[subject][action]:
-            continue
+        keypoints_normalized = False
 
-        for cam_idx in range(len(keypoints[subject][action])):
+    for subject in dataset.subjects():
+        assert (
+            subject in keypoints
+        ), "Subject {} is missing from the 2D detections dataset".format(subject)
+        for action in dataset[subject].keys():
+            assert (
+                action in keypoints[subject]
+            ), "Action {} of subject {} is missing from the 2D detections dataset".format(
+                action, subject
+            )
+            if "positions_3d" not in dataset[subject][action]:
+                continue
 
-            # We check for >= instead of == because some videos in H3.6M contain extra frames
-            mocap_length = dataset[subject][action]["positions_3d"][cam_idx].shape[0]
-            assert keypoints[subject][action][cam_idx].shape[0] >= mocap_length
+            for cam_idx in range(len(keypoints[subject][action])):
 
-            if keypoints[subject][action][cam_idx].shape[0] > mocap_length:
-                # Shorten sequence
-                keypoints[subject][action][cam_idx] = keypoints[subject][action][
-                    cam_idx
-                ][:mocap_length]
+                # We check for >= instead of == because some videos in H3.6M contain extra frames
+                mocap_length = dataset[subject][action]["positions_3d"][cam_idx].shape[0]
+                assert keypoints[subject][action][cam_idx].shape[0] >= mocap_length
 
-        assert len(keypoints[subject][action]) == len(
-            dataset[subject][action]["positions_3d"]
-        )
+                if keypoints[subject][action][cam_idx].shape[0] > mocap_length:
+                    # Shorten sequence
+                    keypoints[subject][action][cam_idx] = keypoints[subject][action][
+                        cam_idx
+                    ][:mocap_length]
 
-for subject in keypoints.keys():
-    for action in keypoints[subject]:
-        for cam_idx, kps in enumerate(keypoints[subject][action]):
-            # Normalize camera frame
-            cam = dataset.cameras()[subject][cam_idx]
-            kps[..., :2] = normalize_screen_coordinates(
-                kps[..., :2], w=cam["res_w"], h=cam["res_h"]
+            assert len(keypoints[subject][action]) == len(
+                dataset[subject][action]["positions_3d"]
             )
-            keypoints[subject][action][cam_idx] = kps
 
-subjects_train = args.subjects_train.split(",")
-subjects_semi = (
-    [] if not args.subjects_unlabeled else args.subjects_unlabeled.split(",")
+    if not keypoints_normalized:
+        for subject in keypoints.keys():
+            for action in keypoints[subject]:
+                for cam_idx, kps in enumerate(keypoints[subject][action]):
+                    # Normalize camera frame
+                    cam = dataset.cameras()[subject][cam_idx]
+                    if not kps.flags.writeable:
+                        kps = np.array(kps)  # Read-only view on a columnar store
+                    kps[..., :2] = normalize_screen_coordinates(
+                        kps[..., :2], w=cam["res_w"], h=cam["res_h"]
+                    )
+                    keypoints[subject][action][cam_idx] = kps
+
+    if data_cache_path is not None and rank == 0:
+        print("Saving prepared data to", data_cache_path)
+        save_prepared_data(data_cache_path, dataset, keypoints, keypoints_metadata)
+
+keypoints_symmetry = keypoints_metadata["keypoints_symmetry"]
+kps_left, kps_right = list(keypoints_symmetry[0]), list(keypoints_symmetry[1])
+joints_left, joints_right = list(dataset.skeleton().joints_left()), list(
+    dataset.skeleton().joints_right()
 )
-if not args.render:
+
+if data_cache_path is None:
+    print("INFO: data loaded in %.2f s" % (time() - data_start_time))
+else:
+    print(
+        "INFO: data loaded in %.2f s (%s start)"
+        % (time() - data_start_time, "warm" if data_cache_hit else "cold")
+    )
+
+subjects_train = args.subjects_train.split(",")
+if args.subjects_test == "*":
+    subjects_test = list(keypoints.keys())
+elif not args.render:
     subjects_test = args.subjects_test.split(",")
 else:
     subjects_test = [args.viz_subject]
+if args.subjects_unlabeled == "*":
+    # All the subjects that are not used for testing
+    subjects_semi = [
+        subject
+        for subject in keypoints.keys()
+        if subject not in subjects_train and subject not in subjects_test
+    ]
+else:
+    subjects_semi = (
+        [] if not args.subjects_unlabeled else args.subjects_unlabeled.split(",")
+    )
 
-semi_supervised = len(subjects_semi) > 0
+# When distilling, unlabeled subjects are supervised by the teacher
+semi_supervised = len(subjects_semi) > 0 and not args.teacher
 if semi_supervised and not dataset.supports_semi_supervised():
     raise RuntimeError("Semi-supervised training is not implemented for this dataset")
 
@@ -198,6 +331,18 @@ if action_filter is not None:
 
 cameras_valid, poses_valid, poses_valid_2d = fetch(subjects_test, action_filter)
 
+checkpoint = None
+if args.resume or args.evaluate:
+    chk_filename = os.path.join(
+        args.checkpoint, args.resume if args.resume else args.evaluate
+    )
+    print("Loading checkpoint", chk_filename)
+    checkpoint = torch.load(chk_filename, map_location=lambda storage, loc: storage)
+    print("This model was trained for {} epochs".format(checkpoint["epoch"]))
+
+# Pruned checkpoints store the number of channels inside each residual block
+inner_channels = None if checkpoint is None else checkpoint.get("inner_channels")
+
 filter_widths = [int(x) for x in args.architecture.split(",")]
 if not args.disable_optimizations and not args.dense and args.stride == 1:
     # Use optimized model for single-frame predictions
@@ -209,6 +354,7 @@ if not args.disable_optimizations and not args.dense and args.stride == 1:
         causal=args.causal,
         dropout=args.dropout,
         channels=args.channels,
+        inner_channels=inner_channels,
     )
 else:
     # When incompatible settings are detected (stride > 1, dense filters, or disabled optimization) fall back to normal model
@@ -221,6 +367,7 @@ else:
         dropout=args.dropout,
         channels=args.channels,
         dense=args.dense,
+        inner_channels=inner_channels,
     )
 
 model_pos = TemporalModel(
@@ -232,6 +379,7 @@ model_pos = TemporalModel(
     dropout=args.dropout,
     channels=args.channels,
     dense=args.dense,
+    inner_channels=inner_channels,
 )
 
 receptive_field = model_pos.receptive_field()
@@ -253,12 +401,6 @@ if torch.cuda.is_available():
     model_pos_train = model_pos_train.cuda()
 
 if args.resume or args.evaluate:
-    chk_filename = os.path.join(
-        args.checkpoint, args.resume if args.resume else args.evaluate
-    )
-    print("Loading checkpoint", chk_filename)
-    checkpoint = torch.load(chk_filename, map_location=lambda storage, loc: storage)
-    print("This model was trained for {} epochs".format(checkpoint["epoch"]))
     model_pos_train.load_state_dict(checkpoint["model_pos"])
     model_pos.load_state_dict(checkpoint["model_pos"])
 
@@ -280,6 +422,128 @@ if args.resume or args.evaluate:
     else:
         model_traj = None
 
+# Mixed precision: the forward passes run under autocast, losses are computed in fp32
+amp_device = "cuda" if torch.cuda.is_available() else "cpu"
+amp_dtype = {"fp32": torch.float32, "bf16": torch.bfloat16, "fp16": torch.float16}[
+    args.precision
+]
+amp_enabled = args.precision != "fp32"
+if args.precision == "fp16" and amp_device == "cpu":
+    raise ValueError("fp16 mixed precision requires CUDA (use bf16 on the CPU)")
+
+
+def autocast(enabled=True):
+    return torch.autocast(amp_device, dtype=amp_dtype, enabled=amp_enabled and enabled)
+
+
+def amp_forward(model, inputs_2d, enabled=True):
+    """
+    Run a model under autocast (if mixed precision is enabled) and return fp32 outputs.
+    """
+    with autocast(enabled):
+        return model(inputs_2d).float()
+
+
+if args.evaluate and args.fuse_bn:
+    from common.fusion import fuse_model, compare_models
+
+    # Benchmark on the first test sequence
+    benchmark_input = np.expand_dims(
+        np.pad(
+            poses_valid_2d[0],
+            ((pad + causal_shift, pad - causal_shift), (0, 0), (0, 0)),
+            "edge",
+        ),
+        axis=0,
+    )
+    benchmark_input = torch.from_numpy(benchmark_input.astype("float32"))
+    if torch.cuda.is_available():
+        benchmark_input = benchmark_input.cuda()
+
+    print("Folding batch normalization into convolutions...")
+    fused_models = [("model_pos", model_pos)]
+    if model_traj is not None:
+        fused_models.append(("model_traj", model_traj))
+    for name, model in fused_models:
+        fused = fuse_model(model)
+        max_diff, time_ref, time_fused = compare_models(model, fused, benchmark_input)
+        print(
+            "INFO: {}: {:.2f} ms -> {:.2f} ms ({:.2f}x speed-up), max abs difference {:.3e}".format(
+                name, time_ref * 1000, time_fused * 1000, time_ref / time_fused, max_diff
+            )
+        )
+        if name == "model_pos":
+            model_pos = fused
+        else:
+            model_traj = fused
+
+if args.evaluate and (args.export_model or args.exported_model):
+    from common.export import ExportedModel, export_model, check_exported_model
+
+    extension = ".onnx" if args.export_format == "onnx" else ".pt"
+    exported_models = [("pos", model_pos)]
+    if model_traj is not None:
+        exported_models.append(("traj", model_traj))
+
+    if args.export_model:
+        for name, model in exported_models:
+            export_path = args.export_model + "_" + name + extension
+            print("Exporting model to", export_path)
+            export_model(model, export_path, args.export_format)
+            max_diff = check_exported_model(model, ExportedModel(export_path))
+            print("INFO: max abs difference with the eager model: {:.3e}".format(max_diff))
+
+    if args.exported_model:
+        for name, model in exported_models:
+            exported_path = args.exported_model + "_" + name + extension
+            print("Loading exported model", exported_path)
+            exported = ExportedModel(exported_path)
+            assert exported.receptive_field() == model.receptive_field()
+            assert exported.total_causal_shift() == model.total_causal_shift()
+            if name == "pos":
+                model_pos = exported
+            else:
+                model_traj = exported
+
+if args.evaluate and args.quantize:
+    from common.quantization import quantize_model, load_calibration_inputs
+
+    if args.quant_calibration:
+        print("Loading calibration data from", args.quant_calibration)
+        calibration_inputs = load_calibration_inputs(
+            args.quant_calibration,
+            pad,
+            causal_shift,
+            max_frames=args.quant_calibration_frames,
+        )
+    else:
+        calibration_inputs = []
+        calibration_frames = 0
+        for seq_2d in poses_valid_2d:
+            if calibration_frames >= args.quant_calibration_frames:
+                break
+            seq_2d = seq_2d[: args.quant_calibration_frames - calibration_frames]
+            calibration_frames += seq_2d.shape[0]
+            seq_2d = np.pad(
+                seq_2d, ((pad + causal_shift, pad - causal_shift), (0, 0), (0, 0)), "edge"
+            )
+            calibration_inputs.append(
+                torch.from_numpy(np.expand_dims(seq_2d, axis=0).astype("float32"))
+            )
+
+    print("Quantizing model to int8...")
+    model_pos_float = model_pos
+    model_pos_int8 = quantize_model(model_pos, calibration_inputs, args.quant_backend)
+    model_pos = model_pos_int8
+    if model_traj is not None:
+        model_traj = quantize_model(model_traj, calibration_inputs, args.quant_backend)
+
+# Combine the pose and trajectory models, so that they can be evaluated in a single pass
+model_pos_traj = None
+if args.evaluate and model_traj is not None:
+    if TemporalModelPosTraj.supports(model_pos, model_traj):
+        model_pos_traj = TemporalModelPosTraj(model_pos, model_traj)
+
 
 test_generator = UnchunkedGenerator(
     cameras_valid,
@@ -295,10 +559,82 @@ test_generator = UnchunkedGenerator(
 )
 print("INFO: Testing on {} frames".format(test_generator.num_frames()))
 
-if not args.evaluate:
-    cameras_train, poses_train, poses_train_2d = fetch(
-        subjects_train, action_filter, subset=args.subset
+
+def predict_teacher(teacher, poses_2d, causal_shift):
+    """
+    Predict 3D poses (with test-time augmentation, if enabled) to be used as distillation targets.
+    """
+    teacher_pad = (teacher.receptive_field() - 1) // 2
+    gen = UnchunkedGenerator(
+        None,
+        None,
+        poses_2d,
+        pad=teacher_pad,
+        causal_shift=causal_shift,
+        augment=args.test_time_augmentation,
+        kps_left=kps_left,
+        kps_right=kps_right,
+        joints_left=joints_left,
+        joints_right=joints_right,
     )
+    targets = []
+    with torch.no_grad():
+        teacher.eval()
+        for _, _, batch_2d in gen.next_epoch():
+            inputs_2d = torch.from_numpy(batch_2d.astype("float32"))
+            if torch.cuda.is_available():
+                inputs_2d = inputs_2d.cuda()
+            predicted_3d_pos = teacher(inputs_2d)
+            if gen.augment_enabled():
+                predicted_3d_pos[1, :, :, 0] *= -1
+                predicted_3d_pos[1, :, joints_left + joints_right] = predicted_3d_pos[
+                    1, :, joints_right + joints_left
+                ]
+                predicted_3d_pos = torch.mean(predicted_3d_pos, dim=0, keepdim=True)
+            targets.append(predicted_3d_pos.squeeze(0).cpu().numpy())
+    return targets
+
+
+if args.teacher and poses_valid is None and not args.no_eval:
+    print("INFO: the test subjects have no 3D ground truth, disabling evaluation")
+    args.no_eval = True
+
+if not args.evaluate:
+    if args.teacher:
+        teacher_filename = os.path.join(args.checkpoint, args.teacher)
+        print("Loading teacher", teacher_filename)
+        teacher_checkpoint = torch.load(
+            teacher_filename, map_location=lambda storage, loc: storage
+        )
+        teacher_filter_widths = [int(x) for x in args.teacher_architecture.split(",")]
+        teacher = TemporalModel(
+            poses_valid_2d[0].shape[-2],
+            poses_valid_2d[0].shape[-1],
+            dataset.skeleton().num_joints(),
+            filter_widths=teacher_filter_widths,
+            causal=args.teacher_causal,
+            channels=args.teacher_channels,
+            inner_channels=teacher_checkpoint.get("inner_channels"),
+        )
+        if torch.cuda.is_available():
+            teacher = teacher.cuda()
+        teacher.load_state_dict(teacher_checkpoint["model_pos"])
+
+        # Labeled and unlabeled subjects are both supervised by the teacher predictions
+        subjects_distill = [s for s in subjects_train + subjects_semi if s]
+        cameras_train, _, poses_train_2d = fetch(
+            subjects_distill, action_filter, subset=args.subset, parse_3d_poses=False
+        )
+        print("Computing teacher predictions...")
+        teacher_causal_shift = (
+            (teacher.receptive_field() - 1) // 2 if args.teacher_causal else 0
+        )
+        poses_train = predict_teacher(teacher, poses_train_2d, teacher_causal_shift)
+        del teacher
+    else:
+        cameras_train, poses_train, poses_train_2d = fetch(
+            subjects_train, action_filter, subset=args.subset
+        )
 
     lr = args.learning_rate
     if semi_supervised:
@@ -360,18 +696,26 @@ if not args.evaluate:
     else:
         optimizer = optim.Adam(model_pos_train.parameters(), lr=lr, amsgrad=True)
 
+    # Loss scaling is only needed with fp16 (bf16 has the same exponent range as fp32)
+    scaler = torch.cuda.amp.GradScaler(enabled=args.precision == "fp16")
+
     lr_decay = args.lr_decay
 
     losses_3d_train = []
     losses_3d_train_eval = []
     losses_3d_valid = []
+    losses_3d_valid_fp32 = []
 
     epoch = 0
     initial_momentum = 0.1
     final_momentum = 0.001
 
+    if args.batch_size // args.stride % world_size != 0:
+        print(
+            "WARNING: the batch size is not divisible by the number of processes and will be rounded down"
+        )
     train_generator = ChunkedGenerator(
-        args.batch_size // args.stride,
+        args.batch_size // args.stride // world_size,
         cameras_train,
         poses_train,
         poses_train_2d,
@@ -384,6 +728,11 @@ if not args.evaluate:
         kps_right=kps_right,
         joints_left=joints_left,
         joints_right=joints_right,
+        shuffle_block=args.shuffle_block,
+        shuffle_buffer=args.shuffle_buffer,
+        num_shards=world_size,
+        shard=rank,
+        out_of_core=args.out_of_core,
     )
     train_generator_eval = UnchunkedGenerator(
         cameras_train,
@@ -396,7 +745,7 @@ if not args.evaluate:
     print("INFO: Training on {} frames".format(train_generator_eval.num_frames()))
     if semi_supervised:
         semi_generator = ChunkedGenerator(
-            args.batch_size // args.stride,
+            args.batch_size // args.stride // world_size,
             cameras_semi,
             None,
             poses_semi_2d,
@@ -411,6 +760,11 @@ if not args.evaluate:
             joints_left=joints_left,
             joints_right=joints_right,
             endless=True,
+            shuffle_block=args.shuffle_block,
+            shuffle_buffer=args.shuffle_buffer,
+            num_shards=world_size,
+            shard=rank,
+            out_of_core=args.out_of_core,
         )
         semi_generator_eval = UnchunkedGenerator(
             cameras_semi,
@@ -426,6 +780,15 @@ if not args.evaluate:
             )
         )
 
+    if args.prefetch > 0:
+        train_generator = PrefetchGenerator(
+            train_generator, args.prefetch, args.prefetch_workers
+        )
+        if semi_supervised:
+            semi_generator = PrefetchGenerator(
+                semi_generator, args.prefetch, args.prefetch_workers
+            )
+
     if args.resume:
         epoch = checkpoint["epoch"]
         if "optimizer" in checkpoint and checkpoint["optimizer"] is not None:
@@ -442,6 +805,18 @@ if not args.evaluate:
             model_traj.load_state_dict(checkpoint["model_traj"])
             semi_generator.set_random_state(checkpoint["random_state_semi"])
 
+    # The raw modules are still used for state_dict() and set_bn_momentum()
+    model_pos_parallel = model_pos_train
+    model_traj_parallel = model_traj_train if semi_supervised else None
+    if args.distributed:
+        # Gradients are averaged over the processes during backward()
+        model_pos_parallel = DistributedDataParallel(model_pos_train)
+        if semi_supervised:
+            model_traj_parallel = DistributedDataParallel(model_traj_train)
+
+    # Only the first process evaluates the model at the end of each epoch
+    epoch_eval = not args.no_eval and rank == 0
+
     print(
         "** Note: reported losses are averaged over all frames and test-time augmentation is not used here."
     )
@@ -466,8 +841,9 @@ if not args.evaluate:
                 # Fall back to supervised training for the first epoch (to avoid instability)
                 skip = epoch < args.warmup
 
-                cam_semi = torch.from_numpy(cam_semi.astype("float32"))
-                inputs_3d = torch.from_numpy(batch_3d.astype("float32"))
+                # ChunkedGenerator returns newly allocated float32 arrays
+                cam_semi = torch.from_numpy(cam_semi)
+                inputs_3d = torch.from_numpy(batch_3d)
                 if torch.cuda.is_available():
                     cam_semi = cam_semi.cuda()
                     inputs_3d = inputs_3d.cuda()
@@ -478,8 +854,8 @@ if not args.evaluate:
                 # Split point between labeled and unlabeled samples in the batch
                 split_idx = inputs_3d.shape[0]
 
-                inputs_2d = torch.from_numpy(batch_2d.astype("float32"))
-                inputs_2d_semi = torch.from_numpy(batch_2d_semi.astype("float32"))
+                inputs_2d = torch.from_numpy(batch_2d)
+                inputs_2d_semi = torch.from_numpy(batch_2d_semi)
                 if torch.cuda.is_available():
                     inputs_2d = inputs_2d.cuda()
                     inputs_2d_semi = inputs_2d_semi.cuda()
@@ -492,7 +868,7 @@ if not args.evaluate:
                 optimizer.zero_grad()
 
                 # Compute 3D poses
-                predicted_3d_pos_cat = model_pos_train(inputs_2d_cat)
+                predicted_3d_pos_cat = amp_forward(model_pos_parallel, inputs_2d_cat)
 
                 loss_3d_pos = mpjpe(predicted_3d_pos_cat[:split_idx], inputs_3d)
                 epoch_loss_3d_train += (
@@ -502,7 +878,7 @@ if not args.evaluate:
                 loss_total = loss_3d_pos
 
                 # Compute global trajectory
-                predicted_traj_cat = model_traj_train(inputs_2d_cat)
+                predicted_traj_cat = amp_forward(model_traj_parallel, inputs_2d_cat)
                 w = (
                     1 / inputs_traj[:, :, :, 2]
                 )  # Weight inversely proportional to depth
@@ -567,16 +943,31 @@ if not args.evaluate:
                 else:
                     N_semi += 1  # To avoid division by zero
 
-                loss_total.backward()
-
-                optimizer.step()
+                scaler.scale(loss_total).backward()
+
+                scaler.step(optimizer)
+                scaler.update()
+            (
+                epoch_loss_3d_train,
+                epoch_loss_traj_train,
+                epoch_loss_2d_train_unlabeled,
+                N,
+                N_semi,
+            ) = reduce_sum(
+                epoch_loss_3d_train,
+                epoch_loss_traj_train,
+                epoch_loss_2d_train_unlabeled,
+                N,
+                N_semi,
+            )
             losses_traj_train.append(epoch_loss_traj_train / N)
             losses_2d_train_unlabeled.append(epoch_loss_2d_train_unlabeled / N_semi)
         else:
             # Regular supervised scenario
             for _, batch_3d, batch_2d in train_generator.next_epoch():
-                inputs_3d = torch.from_numpy(batch_3d.astype("float32"))
-                inputs_2d = torch.from_numpy(batch_2d.astype("float32"))
+                # ChunkedGenerator returns newly allocated float32 arrays
+                inputs_3d = torch.from_numpy(batch_3d)
+                inputs_2d = torch.from_numpy(batch_2d)
                 if torch.cuda.is_available():
                     inputs_3d = inputs_3d.cuda()
                     inputs_2d = inputs_2d.cuda()
@@ -585,7 +976,7 @@ if not args.evaluate:
                 optimizer.zero_grad()
 
                 # Predict 3D poses
-                predicted_3d_pos = model_pos_train(inputs_2d)
+                predicted_3d_pos = amp_forward(model_pos_parallel, inputs_2d)
                 loss_3d_pos = mpjpe(predicted_3d_pos, inputs_3d)
                 epoch_loss_3d_train += (
                     inputs_3d.shape[0] * inputs_3d.shape[1] * loss_3d_pos.item()
@@ -593,11 +984,14 @@ if not args.evaluate:
                 N += inputs_3d.shape[0] * inputs_3d.shape[1]
 
                 loss_total = loss_3d_pos
-                loss_total.backward()
+                scaler.scale(loss_total).backward()
 
-                optimizer.step()
+                scaler.step(optimizer)
+                scaler.update()
+            epoch_loss_3d_train, N = reduce_sum(epoch_loss_3d_train, N)
 
         losses_3d_train.append(epoch_loss_3d_train / N)
+        train_time = time() - start_time
 
         # End-of-epoch evaluation
         with torch.no_grad():
@@ -608,11 +1002,12 @@ if not args.evaluate:
                 model_traj.eval()
 
             epoch_loss_3d_valid = 0
+            epoch_loss_3d_valid_fp32 = 0
             epoch_loss_traj_valid = 0
             epoch_loss_2d_valid = 0
             N = 0
 
-            if not args.no_eval:
+            if epoch_eval:
                 # Evaluate on test set
                 for cam, batch, batch_2d in test_generator.next_epoch():
                     inputs_3d = torch.from_numpy(batch.astype("float32"))
@@ -624,11 +1019,21 @@ if not args.evaluate:
                     inputs_3d[:, :, 0] = 0
 
                     # Predict 3D poses
-                    predicted_3d_pos = model_pos(inputs_2d)
+                    predicted_3d_pos = amp_forward(model_pos, inputs_2d)
                     loss_3d_pos = mpjpe(predicted_3d_pos, inputs_3d)
                     epoch_loss_3d_valid += (
                         inputs_3d.shape[0] * inputs_3d.shape[1] * loss_3d_pos.item()
                     )
+                    if amp_enabled:
+                        # Reference error in full precision, to report the accuracy impact
+                        loss_3d_pos_fp32 = mpjpe(
+                            amp_forward(model_pos, inputs_2d, enabled=False), inputs_3d
+                        )
+                        epoch_loss_3d_valid_fp32 += (
+                            inputs_3d.shape[0]
+                            * inputs_3d.shape[1]
+                            * loss_3d_pos_fp32.item()
+                        )
                     N += inputs_3d.shape[0] * inputs_3d.shape[1]
 
                     if semi_supervised:
@@ -636,7 +1041,7 @@ if not args.evaluate:
                         if torch.cuda.is_available():
                             cam = cam.cuda()
 
-                        predicted_traj = model_traj(inputs_2d)
+                        predicted_traj = amp_forward(model_traj, inputs_2d)
                         loss_traj = mpjpe(predicted_traj, inputs_traj)
                         epoch_loss_traj_valid += (
                             inputs_traj.shape[0]
@@ -669,6 +1074,7 @@ if not args.evaluate:
                         )
 
                 losses_3d_valid.append(epoch_loss_3d_valid / N)
+                losses_3d_valid_fp32.append(epoch_loss_3d_valid_fp32 / N)
                 if semi_supervised:
                     losses_traj_valid.append(epoch_loss_traj_valid / N)
                     losses_2d_valid.append(epoch_loss_2d_valid / N)
@@ -692,7 +1098,7 @@ if not args.evaluate:
                     inputs_3d[:, :, 0] = 0
 
                     # Compute 3D poses
-                    predicted_3d_pos = model_pos(inputs_2d)
+                    predicted_3d_pos = amp_forward(model_pos, inputs_2d)
                     loss_3d_pos = mpjpe(predicted_3d_pos, inputs_3d)
                     epoch_loss_3d_train_eval += (
                         inputs_3d.shape[0] * inputs_3d.shape[1] * loss_3d_pos.item()
@@ -703,7 +1109,7 @@ if not args.evaluate:
                         cam = torch.from_numpy(cam.astype("float32"))
                         if torch.cuda.is_available():
                             cam = cam.cuda()
-                        predicted_traj = model_traj(inputs_2d)
+                        predicted_traj = amp_forward(model_traj, inputs_2d)
                         loss_traj = mpjpe(predicted_traj, inputs_traj)
                         epoch_loss_traj_train_eval += (
                             inputs_traj.shape[0]
@@ -751,8 +1157,8 @@ if not args.evaluate:
                             cam = cam.cuda()
                             inputs_2d_semi = inputs_2d_semi.cuda()
 
-                        predicted_3d_pos_semi = model_pos(inputs_2d_semi)
-                        predicted_traj_semi = model_traj(inputs_2d_semi)
+                        predicted_3d_pos_semi = amp_forward(model_pos, inputs_2d_semi)
+                        predicted_traj_semi = amp_forward(model_traj, inputs_2d_semi)
                         if pad > 0:
                             target_semi = inputs_2d_semi[
                                 :, pad:-pad, :, :2
@@ -780,7 +1186,7 @@ if not args.evaluate:
 
         elapsed = (time() - start_time) / 60
 
-        if args.no_eval:
+        if not epoch_eval:
             print(
                 "[%d] time %.2f lr %f 3d_train %f"
                 % (epoch + 1, elapsed, lr, losses_3d_train[-1] * 1000)
@@ -817,6 +1223,43 @@ if not args.evaluate:
                     )
                 )
 
+        if args.prefetch > 0:
+            blocked_time = train_generator.blocked_time
+            if semi_supervised:
+                blocked_time += semi_generator.blocked_time
+            print(
+                "[%d] data_wait %.2f s (%.1f%% of the training time)"
+                % (epoch + 1, blocked_time, 100 * blocked_time / train_time)
+            )
+            train_generator.blocked_time = 0
+            if semi_supervised:
+                semi_generator.blocked_time = 0
+
+        if args.out_of_core:
+            io_bytes, io_time = train_generator.io_stats()
+            if semi_supervised:
+                semi_bytes, semi_time = semi_generator.io_stats()
+                io_bytes += semi_bytes
+                io_time += semi_time
+            print(
+                "[%d] io %.1f MB read at %.1f MB/s"
+                % (epoch + 1, io_bytes / 1e6, io_bytes / 1e6 / max(io_time, 1e-9))
+            )
+
+        if amp_enabled:
+            # get_scale() is 1 when loss scaling is disabled (bf16)
+            report = "[%d] precision %s loss_scale %g" % (
+                epoch + 1,
+                args.precision,
+                scaler.get_scale(),
+            )
+            if epoch_eval:
+                report += " 3d_valid_fp32 %f 3d_valid_delta %f" % (
+                    losses_3d_valid_fp32[-1] * 1000,
+                    (losses_3d_valid[-1] - losses_3d_valid_fp32[-1]) * 1000,
+                )
+            print(report)
+
         # Decay learning rate exponentially
         lr *= lr_decay
         for param_group in optimizer.param_groups:
@@ -832,7 +1275,7 @@ if not args.evaluate:
             model_traj_train.set_bn_momentum(momentum)
 
         # Save checkpoint if necessary
-        if epoch % args.checkpoint_frequency == 0:
+        if epoch % args.checkpoint_frequency == 0 and rank == 0:
             chk_path = os.path.join(args.checkpoint, "epoch_{}.bin".format(epoch))
             print("Saving checkpoint to", chk_path)
 
@@ -849,12 +1292,13 @@ if not args.evaluate:
                     "random_state_semi": (
                         semi_generator.random_state() if semi_supervised else None
                     ),
+                    "inner_channels": inner_channels,
                 },
                 chk_path,
             )
 
         # Save training curves after every epoch, as .png images (if requested)
-        if args.export_training_curves and epoch > 3:
+        if args.export_training_curves and epoch > 3 and rank == 0:
             if "matplotlib" not in sys.modules:
                 import matplotlib
 
@@ -902,20 +1346,54 @@ if not args.evaluate:
                 plt.savefig(os.path.join(args.checkpoint, "loss_2d.png"))
             plt.close("all")
 
+    if args.distributed:
+        dist.destroy_process_group()
+        if rank != 0:
+            # The final evaluation is only carried out by the first process
+            sys.exit(0)
+
 
 # Evaluate
+def forward_eval(model, inputs_2d):
+    if args.window_size > 0:
+        return windowed_forward(
+            model,
+            inputs_2d,
+            args.window_size,
+            args.window_workers,
+            tile_context=autocast,
+        ).float()
+    return amp_forward(model, inputs_2d)
+
+
+def print_errors(action, augment, e1, e2, e3, ev):
+    if action is None:
+        print("----------")
+    else:
+        print("----" + action + "----")
+    print("Test time augmentation:", augment)
+    print("Protocol #1 Error (MPJPE):", e1, "mm")
+    print("Protocol #2 Error (P-MPJPE):", e2, "mm")
+    print("Protocol #3 Error (N-MPJPE):", e3, "mm")
+    print("Velocity Error (MPJVE):", ev, "mm")
+    print("----------")
+
+
 def evaluate(
-    test_generator, action=None, return_predictions=False, use_trajectory_model=False
+    test_generator,
+    action=None,
+    return_predictions=False,
+    use_trajectory_model=False,
+    model=None,
 ):
     epoch_loss_3d_pos = 0
     epoch_loss_3d_pos_procrustes = 0
     epoch_loss_3d_pos_scale = 0
     epoch_loss_3d_vel = 0
+    if model is None:
+        model = model_pos if not use_trajectory_model else model_traj
     with torch.no_grad():
-        if not use_trajectory_model:
-            model_pos.eval()
-        else:
-            model_traj.eval()
+        model.eval()
         N = 0
         for _, batch, batch_2d in test_generator.next_epoch():
             inputs_2d = torch.from_numpy(batch_2d.astype("float32"))
@@ -923,10 +1401,7 @@ def evaluate(
                 inputs_2d = inputs_2d.cuda()
 
             # Positional model
-            if not use_trajectory_model:
-                predicted_3d_pos = model_pos(inputs_2d)
-            else:
-                predicted_3d_pos = model_traj(inputs_2d)
+            predicted_3d_pos = forward_eval(model, inputs_2d)
 
             # Test-time augmentation (if enabled)
             if test_generator.augment_enabled():
@@ -982,24 +1457,76 @@ def evaluate(
                 * mean_velocity_error(predicted_3d_pos, inputs)
             )
 
-    if action is None:
-        print("----------")
-    else:
-        print("----" + action + "----")
     e1 = (epoch_loss_3d_pos / N) * 1000
     e2 = (epoch_loss_3d_pos_procrustes / N) * 1000
     e3 = (epoch_loss_3d_pos_scale / N) * 1000
     ev = (epoch_loss_3d_vel / N) * 1000
-    print("Test time augmentation:", test_generator.augment_enabled())
-    print("Protocol #1 Error (MPJPE):", e1, "mm")
-    print("Protocol #2 Error (P-MPJPE):", e2, "mm")
-    print("Protocol #3 Error (N-MPJPE):", e3, "mm")
-    print("Velocity Error (MPJVE):", ev, "mm")
-    print("----------")
+    print_errors(action, test_generator.augment_enabled(), e1, e2, e3, ev)
 
     return e1, e2, e3, ev
 
 
+def evaluate_batched(test_generator, seq_actions):
+    """
+    Evaluate the pose model on a BucketedGenerator. The errors of each sequence are computed
+    on its valid frames only, exactly as evaluate() would, and accumulated per action.
+
+    Arguments:
+    test_generator -- BucketedGenerator
+    seq_actions -- action of each sequence of the generator
+
+    Returns a dictionary action -> (e1, e2, e3, ev).
+    """
+    totals = {}  # Action -> [frames, MPJPE, P-MPJPE, N-MPJPE, MPJVE] (summed over the frames)
+    with torch.no_grad():
+        model_pos.eval()
+        for batch_3d, batch_2d, indices, lengths in test_generator.next_epoch():
+            inputs_2d = torch.from_numpy(batch_2d)
+            if torch.cuda.is_available():
+                inputs_2d = inputs_2d.cuda()
+            predicted_3d_pos = forward_eval(model_pos, inputs_2d)
+
+            # Test-time augmentation (if enabled)
+            if test_generator.augment_enabled():
+                # Undo flipping and take average with non-flipped version
+                rows = len(indices)
+                flipped = predicted_3d_pos[rows:]
+                flipped[:, :, :, 0] *= -1
+                flipped[:, :, joints_left + joints_right] = flipped[
+                    :, :, joints_right + joints_left
+                ]
+                predicted_3d_pos = (predicted_3d_pos[:rows] + flipped) / 2
+
+            inputs_3d = torch.from_numpy(batch_3d)
+            if torch.cuda.is_available():
+                inputs_3d = inputs_3d.cuda()
+            inputs_3d[:, :, 0] = 0
+            predicted_np = predicted_3d_pos.cpu().numpy()
+            inputs_np = inputs_3d.cpu().numpy()
+
+            for row, (seq_i, length) in enumerate(zip(indices, lengths)):
+                # The frames beyond the length of the sequence are padding
+                predicted = predicted_3d_pos[row : row + 1, :length]
+                target = inputs_3d[row : row + 1, :length]
+                errors = totals.setdefault(seq_actions[seq_i], np.zeros(5))
+                errors += length * np.array(
+                    [
+                        1,
+                        mpjpe(predicted, target).item(),
+                        p_mpjpe(predicted_np[row, :length], inputs_np[row, :length]),
+                        n_mpjpe(predicted, target).item(),
+                        mean_velocity_error(
+                            predicted_np[row, :length], inputs_np[row, :length]
+                        ),
+                    ]
+                )
+
+    results = {}
+    for action, (N, e1, e2, e3, ev) in totals.items():
+        results[action] = (e1 / N * 1000, e2 / N * 1000, e3 / N * 1000, ev / N * 1000)
+    return results
+
+
 if args.render:
     print("Rendering...")
 
@@ -1030,12 +1557,16 @@ if args.render:
         joints_left=joints_left,
         joints_right=joints_right,
     )
-    prediction = evaluate(gen, return_predictions=True)
-    if model_traj is not None and ground_truth is None:
-        prediction_traj = evaluate(
-            gen, return_predictions=True, use_trajectory_model=True
-        )
-        prediction += prediction_traj
+    if model_pos_traj is not None and ground_truth is None:
+        # Predict poses and trajectory in a single pass
+        prediction = evaluate(gen, return_predictions=True, model=model_pos_traj)
+    else:
+        prediction = evaluate(gen, return_predictions=True)
+        if model_traj is not None and ground_truth is None:
+            prediction_traj = evaluate(
+                gen, return_predictions=True, use_trajectory_model=True
+            )
+            prediction += prediction_traj
 
     if args.viz_export is not None:
         print("Exporting joint positions to", args.viz_export)
@@ -1096,6 +1627,93 @@ if args.render:
             input_video_skip=args.viz_skip,
         )
 
+elif args.export_predictions:
+    print("Predicting all test sequences...")
+    sequence_keys = []
+    sequences_2d = []
+    for subject in subjects_test:
+        for action in keypoints[subject].keys():
+            if action_filter is not None and not any(
+                action.startswith(a) for a in action_filter
+            ):
+                continue
+            for cam_idx, kps in enumerate(keypoints[subject][action]):
+                sequence_keys.append((subject, action, cam_idx))
+                sequences_2d.append(kps)
+
+    start_time = time()
+    device = "cuda" if torch.cuda.is_available() else None
+    if args.keyframe_step > 1:
+        # Sparse inference: only compute the activations needed by the selected frames,
+        # with the models as configured above (fused, quantized or exported)
+        def keyframe_predict(model, joints_left=None, joints_right=None):
+            return [
+                predict_keyframes(
+                    model,
+                    kps,
+                    np.arange(0, kps.shape[0], args.keyframe_step),
+                    pad,
+                    causal_shift,
+                    device=device,
+                    augment=args.test_time_augmentation,
+                    kps_left=kps_left,
+                    kps_right=kps_right,
+                    joints_left=joints_left,
+                    joints_right=joints_right,
+                )
+                for kps in sequences_2d
+            ]
+
+        if model_pos_traj is not None:
+            # Predict poses and trajectory in a single pass
+            predictions = keyframe_predict(model_pos_traj, joints_left, joints_right)
+        else:
+            predictions = keyframe_predict(model_pos, joints_left, joints_right)
+        if model_pos_traj is None and model_traj is not None:
+            predictions_traj = keyframe_predict(model_traj)
+            predictions = [p + t for p, t in zip(predictions, predictions_traj)]
+    else:
+        gen = PackedGenerator(
+            sequences_2d,
+            max_frames=args.packed_frames,
+            batch_size=args.packed_batch,
+            pad=pad,
+            causal_shift=causal_shift,
+            augment=args.test_time_augmentation,
+            kps_left=kps_left,
+            kps_right=kps_right,
+        )
+        if model_pos_traj is not None:
+            # Predict poses and trajectory in a single pass
+            predictions = packed_predict(
+                model_pos_traj, gen, joints_left, joints_right, device
+            )
+        else:
+            predictions = packed_predict(
+                model_pos, gen, joints_left, joints_right, device
+            )
+        if model_pos_traj is None and model_traj is not None:
+            predictions_traj = packed_predict(model_traj, gen, device=device)
+            predictions = [p + t for p, t in zip(predictions, predictions_traj)]
+    elapsed = time() - start_time
+    num_frames = sum(prediction.shape[0] for prediction in predictions)
+    print(
+        "INFO: {} sequences, {} frames in {:.2f} s ({:.1f} FPS)".format(
+            len(sequences_2d), num_frames, elapsed, num_frames / elapsed
+        )
+    )
+
+    # Predictions are in camera space, with the same layout as the 2D detections
+    positions_3d = {}
+    for (subject, action, cam_idx), prediction in zip(sequence_keys, predictions):
+        cameras = positions_3d.setdefault(subject, {}).setdefault(action, [])
+        assert len(cameras) == cam_idx
+        cameras.append(prediction)
+    print("Exporting joint positions to", args.export_predictions)
+    np.savez_compressed(args.export_predictions, positions_3d=positions_3d)
+
+elif poses_valid is None:
+    print("INFO: the test subjects have no 3D ground truth, skipping evaluation")
 else:
     print("Evaluating...")
     all_actions = {}
@@ -1142,7 +1760,9 @@ else:
         errors_p2 = []
         errors_p3 = []
         errors_vel = []
+        num_frames = 0
 
+        action_keys = []
         for action_key in actions.keys():
             if action_filter is not None:
                 found = False
@@ -1152,25 +1772,56 @@ else:
                         break
                 if not found:
                     continue
-
-            poses_act, poses_2d_act = fetch_actions(actions[action_key])
-            gen = UnchunkedGenerator(
-                None,
-                poses_act,
-                poses_2d_act,
+            action_keys.append(action_key)
+
+        if args.eval_batch > 0:
+            # Evaluate the sequences of all the actions at once, in batches of similar length
+            poses_all, poses_2d_all, seq_actions = [], [], []
+            for action_key in action_keys:
+                poses_act, poses_2d_act = fetch_actions(actions[action_key])
+                poses_all += poses_act
+                poses_2d_all += poses_2d_act
+                seq_actions += [action_key] * len(poses_2d_act)
+            gen = BucketedGenerator(
+                poses_all,
+                poses_2d_all,
+                batch_size=args.eval_batch,
                 pad=pad,
                 causal_shift=causal_shift,
                 augment=args.test_time_augmentation,
                 kps_left=kps_left,
                 kps_right=kps_right,
-                joints_left=joints_left,
-                joints_right=joints_right,
             )
-            e1, e2, e3, ev = evaluate(gen, action_key)
-            errors_p1.append(e1)
-            errors_p2.append(e2)
-            errors_p3.append(e3)
-            errors_vel.append(ev)
+            results = evaluate_batched(gen, seq_actions)
+            for action_key in action_keys:
+                e1, e2, e3, ev = results[action_key]
+                print_errors(action_key, gen.augment_enabled(), e1, e2, e3, ev)
+                errors_p1.append(e1)
+                errors_p2.append(e2)
+                errors_p3.append(e3)
+                errors_vel.append(ev)
+            num_frames += gen.num_frames()
+        else:
+            for action_key in action_keys:
+                poses_act, poses_2d_act = fetch_actions(actions[action_key])
+                gen = UnchunkedGenerator(
+                    None,
+                    poses_act,
+                    poses_2d_act,
+                    pad=pad,
+                    causal_shift=causal_shift,
+                    augment=args.test_time_augmentation,
+                    kps_left=kps_left,
+                    kps_right=kps_right,
+                    joints_left=joints_left,
+                    joints_right=joints_right,
+                )
+                e1, e2, e3, ev = evaluate(gen, action_key)
+                errors_p1.append(e1)
+                errors_p2.append(e2)
+                errors_p3.append(e3)
+                errors_vel.append(ev)
+                num_frames += gen.num_frames()
 
         print(
             "Protocol #1   (MPJPE) action-wise average:",
@@ -1192,8 +1843,26 @@ else:
             round(np.mean(errors_vel), 2),
             "mm",
         )
+        return (
+            np.mean(errors_p1),
+            np.mean(errors_p2),
+            np.mean(errors_p3),
+            np.mean(errors_vel),
+            num_frames,
+        )
 
-    if not args.by_subject:
+    if args.quantize:
+        summary = []
+        for name, model in (("float32", model_pos_float), ("int8", model_pos_int8)):
+            print("Evaluating {} model".format(name))
+            model_pos = model
+            start_time = time()
+            e1, e2, e3, ev, num_frames = run_evaluation(all_actions, action_filter)
+            summary.append((name, e1, e2, e3, num_frames / (time() - start_time)))
+        print("Model      MPJPE  P-MPJPE  N-MPJPE        FPS")
+        for name, e1, e2, e3, fps in summary:
+            print("{:8} {:7.1f} {:8.1f} {:8.1f} {:10.1f}".format(name, e1, e2, e3, fps))
+    elif not args.by_subject:
         run_evaluation(all_actions, action_filter)
     else:
         for subject in all_actions_by_subject.keys():
@@ -0,0 +1,311 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import argparse
+import io
+import json
+import os
+import socketserver
+import zipfile
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Event, Thread
+from time import time
+
+import numpy as np
+
+from common.camera import normalize_screen_coordinates
+from common.h36m_skeleton import h36m_skeleton_17
+from common.inference import Lifter
+
+class LiftingError(RuntimeError):
+    """
+    Raised when the prediction of a (valid) sequence fails.
+    """
+    pass
+
+class LiftingTimeout(RuntimeError):
+    """
+    Raised when a sequence is not predicted in time (e.g. the service is overloaded).
+    """
+    pass
+
+class DynamicBatcher:
+    """
+    Coalesce the sequences submitted concurrently (e.g. by different requests) into a single
+    call to Lifter.predict(), i.e. a single batched forward pass.
+    A batch is started as soon as max_batch sequences are pending, or when the oldest pending
+    sequence has waited for max_wait seconds. Sequences are batched in arrival order, and only
+    with sequences that have the same keypoint layout (left/right keypoints).
+    If a batch fails, its sequences are predicted again one by one, so that an error
+    only affects the sequences that cause it. Any other error in the batching thread is
+    reported to the sequences of the current batch, and the thread keeps running.
+
+    Arguments:
+    lifter -- Lifter used for the predictions (only called from the batching thread)
+    max_batch -- maximum number of sequences in a batch
+    max_wait -- maximum time (in seconds) a sequence waits for other sequences to be batched with
+    latency_window -- number of recent sequences used to compute the latency percentiles
+    timeout -- maximum time (in seconds) between the submission of a sequence and its prediction
+    """
+    def __init__(self, lifter, max_batch=16, max_wait=0.005, latency_window=1000, timeout=60):
+        self.lifter = lifter
+        self.num_keypoints = lifter.model_pos.num_joints_in
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._pending = deque() # Jobs: [poses_2d, layout, submit time, event, result]
+        self._cond = Condition()
+        self._latencies = deque(maxlen=latency_window)
+        self._batch_sizes = deque(maxlen=latency_window)
+        self._sequences = 0
+        self._frames = 0
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, poses_2d, kps_left, kps_right):
+        """
+        Queue a sequence and return its job, to be passed to result().
+        """
+        job = [poses_2d, (tuple(kps_left), tuple(kps_right)), time(), Event(), None]
+        with self._cond:
+            self._pending.append(job)
+            self._cond.notify()
+        return job
+
+    def result(self, job):
+        """
+        Wait for a job and return its prediction. Raise a LiftingError if it failed,
+        or a LiftingTimeout if it is not predicted within the timeout of its submission.
+        """
+        if not job[3].wait(max(0, job[2] + self.timeout - time())):
+            raise LiftingTimeout('Prediction timed out after {:g} s'.format(self.timeout))
+        if isinstance(job[4], Exception):
+            raise LiftingError('Prediction failed: {}'.format(job[4])) from job[4]
+        return job[4]
+
+    def stats(self):
+        with self._cond:
+            stats = {
+                'queue_depth': len(self._pending),
+                'sequences': self._sequences,
+                'frames': self._frames,
+            }
+            latencies = np.array(self._latencies) * 1000
+            batch_sizes = list(self._batch_sizes)
+        stats['mean_batch_size'] = float(np.mean(batch_sizes)) if len(batch_sizes) > 0 else 0
+        for p in [50, 90, 99]:
+            stats['latency_p{}_ms'.format(p)] = float(np.percentile(latencies, p)) if len(latencies) > 0 else 0
+        return stats
+
+    def _next_batch(self, batch):
+        # Move the next batch of jobs to the given list (owned by the caller, so that
+        # the jobs can still be failed if an error occurs)
+        with self._cond:
+            while len(self._pending) == 0:
+                self._cond.wait()
+            # Wait for more sequences, until the batch is full or the oldest one has waited long enough
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch and time() < deadline:
+                self._cond.wait(deadline - time())
+            layout = self._pending[0][1]
+            for job in list(self._pending):
+                if len(batch) == self.max_batch:
+                    break
+                if job[1] == layout:
+                    batch.append(job)
+                    self._pending.remove(job)
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                self._next_batch(batch)
+                self._process(batch)
+            except Exception as e:
+                # Never let the thread die, or all the pending and future jobs would wait forever
+                for job in batch:
+                    if not job[3].is_set():
+                        job[4] = e
+                        job[3].set()
+
+    def _process(self, batch):
+        kps_left, kps_right = batch[0][1]
+        try:
+            predictions = self.lifter.predict([job[0] for job in batch], list(kps_left), list(kps_right))
+        except Exception:
+            predictions = [self._predict_one(job[0], kps_left, kps_right) for job in batch]
+        for job, prediction in zip(batch, predictions):
+            job[4] = prediction
+            job[3].set()
+        end_time = time()
+        with self._cond:
+            self._latencies.extend(end_time - job[2] for job in batch)
+            self._batch_sizes.append(len(batch))
+            self._sequences += len(batch)
+            self._frames += sum(job[0].shape[0] for job in batch)
+
+    def _predict_one(self, poses_2d, kps_left, kps_right):
+        try:
+            return self.lifter.predict([poses_2d], list(kps_left), list(kps_right))[0]
+        except Exception as e:
+            return e
+
+def lift_archive(batcher, data):
+    """
+    Lift the 2D keypoints of a request archive, i.e. an .npz archive of plain arrays (pickled objects are rejected):
+    kps_0, kps_1, ... -- 2D keypoints of each sequence, in pixels, of shape (frames, keypoints, 2)
+    res_w, res_h -- resolution of the videos
+    kps_left, kps_right -- left/right keypoints (for test-time flipping)
+    Return an .npz archive with the 3D poses (camera space) positions_3d_0, positions_3d_1, ...
+    The archive is validated before any sequence is queued (ValueError or KeyError if it is invalid).
+    """
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        kps_left = [int(k) for k in archive['kps_left']]
+        kps_right = [int(k) for k in archive['kps_right']]
+        w = float(archive['res_w'])
+        h = float(archive['res_h'])
+        num_sequences = sum(1 for name in archive.files if name.startswith('kps_') and name[4:].isdigit())
+        sequences = [np.array(archive['kps_{}'.format(i)], dtype='float32') for i in range(num_sequences)]
+    if len(kps_left) != len(kps_right) or any(not 0 <= k < batcher.num_keypoints for k in kps_left + kps_right):
+        raise ValueError('Invalid keypoint symmetry')
+    if not w > 0 or not h > 0:
+        raise ValueError('Invalid resolution')
+    for i, kps in enumerate(sequences):
+        if kps.ndim != 3 or kps.shape[0] == 0 or kps.shape[1:] != (batcher.num_keypoints, 2):
+            raise ValueError('Expected a non-empty sequence of shape (frames, {}, 2) for kps_{}, got {}'.format(
+                batcher.num_keypoints, i, kps.shape))
+        kps[..., :2] = normalize_screen_coordinates(kps[..., :2], w=w, h=h)
+
+    jobs = [batcher.submit(kps, kps_left, kps_right) for kps in sequences]
+
+    positions_3d = {'positions_3d_{}'.format(i): batcher.result(job) for i, job in enumerate(jobs)}
+    output = io.BytesIO()
+    np.savez_compressed(output, **positions_3d)
+    return output.getvalue()
+
+class LiftingHandler(BaseHTTPRequestHandler):
+    """
+    POST /lift -- body: request archive (see lift_archive, Content-Type: application/x-npz),
+                  response: .npz archive with the 3D poses
+    GET /stats -- queue depth, latency percentiles and throughput (JSON)
+    Requests sent by web browsers (i.e. with an Origin header) are rejected, so that web pages
+    cannot use the service.
+    """
+    batcher = None # Set by serve()
+    content_type = 'application/x-npz'
+
+    def do_POST(self):
+        if self.path != '/lift':
+            self.send_error(404)
+            return
+        if 'Origin' in self.headers:
+            self.send_error(403, 'Cross-origin requests are not allowed')
+            return
+        if self.headers.get_content_type() != self.content_type:
+            self.send_error(415, 'Expected Content-Type: {}'.format(self.content_type))
+            return
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            body = lift_archive(self.batcher, data)
+        except LiftingTimeout as e:
+            self.send_error(503, str(e))
+            return
+        except LiftingError as e:
+            self.send_error(500, str(e))
+            return
+        except (KeyError, ValueError, TypeError, OSError, zipfile.BadZipFile) as e:
+            self.send_error(400, 'Invalid keypoints archive: {}'.format(e))
+            return
+        except Exception as e:
+            self.send_error(500, 'Internal error: {}'.format(e))
+            return
+        self._reply(body, 'application/octet-stream')
+
+    def do_GET(self):
+        if 'Origin' in self.headers:
+            self.send_error(403, 'Cross-origin requests are not allowed')
+            return
+        if self.path != '/stats':
+            self.send_error(404)
+            return
+        self._reply(json.dumps(self.batcher.stats()).encode(), 'application/json')
+
+    def _reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Clients connected to a Unix socket have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Local 3D pose lifting service with dynamic batching')
+    parser.add_argument('-c', '--checkpoint', default='checkpoint', type=str, metavar='PATH', help='checkpoint directory')
+    parser.add_argument('--evaluate', default='pretrained_h36m_detectron_coco.bin', type=str, metavar='FILENAME',
+                        help='checkpoint to use (file name)')
+    parser.add_argument('-arc', '--architecture', default='3,3,3,3,3', type=str, metavar='LAYERS',
+                        help='filter widths separated by comma')
+    parser.add_argument('--causal', action='store_true', help='use causal convolutions')
+    parser.add_argument('-ch', '--channels', default=1024, type=int, metavar='N', help='number of channels in convolution layers')
+    parser.add_argument('--dense', action='store_true', help='use dense convolutions instead of dilated convolutions')
+    parser.add_argument('--keypoints', default=17, type=int, metavar='N', help='number of input 2D keypoints (17 for COCO)')
+    parser.add_argument('-no-tta', '--no-test-time-augmentation', dest='test_time_augmentation', action='store_false',
+                        help='disable test-time flipping')
+    parser.add_argument('--host', default='127.0.0.1', type=str, metavar='ADDR', help='address to listen on')
+    parser.add_argument('--port', default=8000, type=int, metavar='N', help='port to listen on')
+    parser.add_argument('--unix-socket', type=str, metavar='PATH', help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--max-batch', default=16, type=int, metavar='N', help='maximum number of sequences per batch')
+    parser.add_argument('--max-wait', default=5, type=float, metavar='MS',
+                        help='maximum time a sequence waits for other sequences to be batched with')
+    parser.add_argument('--latency-window', default=1000, type=int, metavar='N',
+                        help='number of recent sequences used to compute the latency percentiles')
+    parser.add_argument('--timeout', default=60, type=float, metavar='S',
+                        help='maximum time a sequence waits for its prediction before the request fails (503)')
+    parser.add_argument('--packed-frames', default=8192, type=int, metavar='N', help='input frames per row for packed inference')
+    parser.add_argument('--packed-batch', default=8, type=int, metavar='N', help='rows per batch for packed inference')
+    parser.set_defaults(test_time_augmentation=True)
+    return parser.parse_args()
+
+def serve(args):
+    skeleton = h36m_skeleton_17()
+    lifter = Lifter.from_checkpoint(os.path.join(args.checkpoint, args.evaluate), args.keypoints, 2,
+                                    skeleton.num_joints(),
+                                    filter_widths=[int(x) for x in args.architecture.split(',')],
+                                    causal=args.causal, channels=args.channels, dense=args.dense,
+                                    augment=args.test_time_augmentation,
+                                    joints_left=list(skeleton.joints_left()),
+                                    joints_right=list(skeleton.joints_right()),
+                                    max_frames=args.packed_frames, batch_size=args.packed_batch)
+    LiftingHandler.batcher = DynamicBatcher(lifter, args.max_batch, args.max_wait / 1000, args.latency_window,
+                                           args.timeout)
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        server = ThreadingUnixHTTPServer(args.unix_socket, LiftingHandler)
+        print('Listening on', args.unix_socket)
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), LiftingHandler)
+        print('Listening on {}:{}'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket:
+            os.remove(args.unix_socket)
+
+if __name__ == '__main__':
+    serve(parse_args())
@@ -0,0 +1,75 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.camera import camera_to_world, quaternion_to_matrix, world_to_camera
+from common.quaternion import qinverse, qrot
+
+def reference_world_to_camera(X, R, t):
+    # Quaternion formulation (in float64 torch)
+    X = torch.as_tensor(np.asarray(X), dtype=torch.float64)
+    R = torch.as_tensor(np.asarray(R), dtype=torch.float64)
+    t = torch.as_tensor(np.asarray(t), dtype=torch.float64)
+    Rt = qinverse(R).expand(X.shape[:-1] + (4,))
+    return qrot(Rt, X - t).numpy()
+
+def reference_camera_to_world(X, R, t):
+    X = torch.as_tensor(np.asarray(X), dtype=torch.float64)
+    R = torch.as_tensor(np.asarray(R), dtype=torch.float64)
+    t = torch.as_tensor(np.asarray(t), dtype=torch.float64)
+    return (qrot(R.expand(X.shape[:-1] + (4,)), X) + t).numpy()
+
+class CameraTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        q = rng.randn(4)
+        self.R = q / np.linalg.norm(q)
+        self.t = rng.randn(3)
+        self.X = rng.randn(10, 17, 3)
+
+    def test_quaternion_to_matrix(self):
+        for q in [self.R, self.R.astype('float32'), torch.from_numpy(self.R), torch.from_numpy(self.R).float()]:
+            M = quaternion_to_matrix(q)
+            self.assertEqual(type(M), type(q))
+            self.assertEqual(M.dtype, q.dtype)
+            M = np.asarray(M, dtype='float64')
+            np.testing.assert_allclose(M @ M.T, np.eye(3), atol=1e-6)
+            np.testing.assert_allclose(M, reference_world_to_camera(np.eye(3), np.asarray(q), np.zeros(3)), atol=1e-6)
+
+    def test_against_quaternions(self):
+        for to_input, dtype, tolerance in [(np.asarray, 'float32', 1e-5), (np.asarray, 'float64', 1e-12),
+                                           (torch.as_tensor, 'float32', 1e-5), (torch.as_tensor, 'float64', 1e-12)]:
+            X = to_input(self.X.astype(dtype))
+            with self.subTest(type=type(X).__name__, dtype=dtype):
+                # The orientations of the datasets are float32
+                t = self.t.astype(dtype)
+                for R in [self.R, self.R.astype('float32')]:
+                    for func, reference in [(world_to_camera, reference_world_to_camera),
+                                            (camera_to_world, reference_camera_to_world)]:
+                        Y = func(X, R=R, t=t)
+                        self.assertEqual(type(Y), type(X))
+                        self.assertEqual(Y.dtype, X.dtype)
+                        np.testing.assert_allclose(np.asarray(Y), reference(self.X.astype(dtype), R, t),
+                                                   rtol=tolerance, atol=tolerance * 10)
+
+    def test_round_trip(self):
+        for X in [self.X, self.X.astype('float32'), torch.from_numpy(self.X)]:
+            with self.subTest(type=type(X).__name__, dtype=X.dtype):
+                t = self.t.astype('float32' if X.dtype in (np.float32, torch.float32) else 'float64')
+                Y = camera_to_world(world_to_camera(X, R=self.R, t=t), R=self.R, t=t)
+                tolerance = 1e-5 if Y.dtype in (np.float32, torch.float32) else 1e-12
+                np.testing.assert_allclose(np.asarray(Y), np.asarray(X), atol=tolerance)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import ColumnarStore, is_store, write_store
+
+class ColumnarStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(0)
+        self.positions_2d = {}
+        for subject in ['S9', 'S11']:
+            self.positions_2d[subject] = {}
+            for action in ['Walking', 'WalkingDog 1', 'Eating', 'Walking 1']:
+                self.positions_2d[subject][action] = [rng.randn(5 + cam, 17, 2).astype('float32')
+                                                      for cam in range(2)]
+        write_store(self.tmp.name, {'positions_2d': self.positions_2d})
+        self.store = ColumnarStore(self.tmp.name)
+
+    def tearDown(self):
+        del self.store
+        self.tmp.cleanup()
+
+    def assert_loaded(self, data, subjects, actions):
+        self.assertEqual(sorted(data.keys()), sorted(subjects))
+        for subject in subjects:
+            self.assertEqual(sorted(data[subject].keys()), sorted(actions))
+            for action in actions:
+                expected = self.positions_2d[subject][action]
+                self.assertEqual(len(data[subject][action]), len(expected))
+                for seq, ref in zip(data[subject][action], expected):
+                    np.testing.assert_array_equal(seq, ref)
+
+    def test_load_all(self):
+        data = self.store.load('positions_2d')
+        self.assert_loaded(data, ['S9', 'S11'], ['Walking', 'WalkingDog 1', 'Eating', 'Walking 1'])
+
+    def test_load_action_filter(self):
+        # Actions are matched by prefix, in every subject
+        data = self.store.load('positions_2d', actions=['Walking'])
+        self.assert_loaded(data, ['S9', 'S11'], ['Walking', 'WalkingDog 1', 'Walking 1'])
+
+    def test_load_subject_and_action_filter(self):
+        data = self.store.load('positions_2d', subjects=['S11'], actions=['Eating', 'WalkingDog'])
+        self.assert_loaded(data, ['S11'], ['Eating', 'WalkingDog 1'])
+
+class WriteStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'store')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_interrupted_write(self):
+        # A sequence that cannot be converted fails the write half-way
+        data = {'S1': {'Walking': np.zeros((5, 17, 2)), 'Eating': np.zeros((5, 17, 2), dtype=object)}}
+        data['S1']['Eating'][0, 0, 0] = 'invalid'
+        with self.assertRaises(ValueError):
+            write_store(self.path, {'positions_2d': data})
+        self.assertFalse(is_store(self.path))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_replace(self):
+        write_store(self.path, {'positions_2d': {'S1': {'Walking': np.zeros((5, 17, 2))}}})
+        write_store(self.path, {'positions_2d': {'S2': {'Eating': np.ones((3, 17, 2))}}})
+        self.assertEqual(os.listdir(self.tmp.name), ['store'])
+        store = ColumnarStore(self.path)
+        self.assertEqual(store.keys('positions_2d'), [('S2', 'Eating', None)])
+        np.testing.assert_array_equal(store.get('positions_2d', 'S2', 'Eating'), np.ones((3, 17, 2)))
+
+if __name__ == '__main__':
+    unittest.main()
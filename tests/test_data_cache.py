@@ -0,0 +1,76 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.data_cache import prepared_data_key, save_prepared_data, load_prepared_data
+from common.h36m_dataset import Human36mDataset
+
+class DataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(0)
+        self.dataset_path = os.path.join(self.tmp.name, 'data_3d_h36m.npz')
+        positions_3d = {'S1': {'Walking': rng.randn(20, 32, 3).astype('float32'),
+                               'Eating': rng.randn(10, 32, 3).astype('float32')}}
+        np.savez_compressed(self.dataset_path, positions_3d=positions_3d)
+        self.digests_path = os.path.join(self.tmp.name, 'cache', 'digests.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def key(self):
+        return prepared_data_key([self.dataset_path], None, digests_path=self.digests_path)
+
+    def test_digests_are_reused(self):
+        key = self.key()
+        self.assertTrue(os.path.isfile(self.digests_path))
+        stat = os.stat(self.dataset_path)
+        # Same size and modification time: the file is not hashed again
+        with open(self.dataset_path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xff]))
+        os.utime(self.dataset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.key(), key)
+        # Modified file: the digest is computed again
+        os.utime(self.dataset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertNotEqual(self.key(), key)
+        self.assertEqual(prepared_data_key([self.dataset_path], None), self.key())
+
+    def test_warm_start_without_positions(self):
+        dataset = Human36mDataset(self.dataset_path)
+        keypoints = {}
+        for subject in dataset.subjects():
+            for action, anim in dataset[subject].items():
+                anim['positions_3d'] = [anim['positions'] + i for i in range(4)]
+                keypoints.setdefault(subject, {})[action] = [np.zeros((5, 17, 2), dtype='float32')] * 4
+        cache_path = os.path.join(self.tmp.name, 'cache', self.key())
+        save_prepared_data(cache_path, dataset, keypoints, {'keypoints_symmetry': [[1], [2]]})
+
+        warm = Human36mDataset(self.dataset_path, load_positions=False)
+        self.assertEqual(len(warm.subjects()), 0)
+        self.assertEqual(warm.skeleton().num_joints(), 17)
+        metadata, warm_keypoints = load_prepared_data(cache_path, warm)
+        self.assertEqual(metadata, {'keypoints_symmetry': [[1], [2]]})
+        self.assertEqual(sorted(warm['S1'].keys()), sorted(dataset['S1'].keys()))
+        for action, anim in dataset['S1'].items():
+            self.assertIs(warm['S1'][action]['cameras'], warm.cameras()['S1'])
+            self.assertNotIn('positions', warm['S1'][action])
+            for a, b in zip(warm['S1'][action]['positions_3d'], anim['positions_3d']):
+                np.testing.assert_array_equal(a, b)
+            self.assertEqual(len(warm_keypoints['S1'][action]), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.generators import ChunkedGenerator
+
+class ShardingTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.poses_2d = [rng.randn(n, 17, 2).astype('float32') for n in [103, 57, 211, 80]]
+
+    def shards(self, num_shards, **kwargs):
+        return [ChunkedGenerator(8, None, None, self.poses_2d, 1, pad=4, random_seed=42,
+                                 num_shards=num_shards, shard=shard, **kwargs).next_pairs()[1]
+                for shard in range(num_shards)]
+
+    def test_disjoint_and_equal(self):
+        num_chunks = sum(seq.shape[0] for seq in self.poses_2d)
+        for kwargs in [{}, {'shuffle': False}, {'shuffle_block': 16}, {'shuffle_block': 16, 'shuffle_buffer': 4}]:
+            shards = self.shards(3, **kwargs)
+            self.assertEqual(set(len(shard) for shard in shards), {num_chunks // 3})
+            keys = [(p['seq'], p['start']) for shard in shards for p in shard]
+            self.assertEqual(len(set(keys)), len(keys))
+
+    def test_blocks_stay_in_one_shard(self):
+        block = 16
+        shards = self.shards(4, shuffle_block=block)
+        full = ChunkedGenerator(8, None, None, self.poses_2d, 1, pad=4, random_seed=42,
+                                shuffle_block=block).next_pairs()[1]
+        # Chunks are indexed sequence by sequence, so a block is a range of block chunk indices
+        lengths = np.array([seq.shape[0] for seq in self.poses_2d])
+        offsets = np.cumsum(lengths) - lengths
+        owners = {}
+        for shard_i, shard in enumerate(shards):
+            for p in shard:
+                owners.setdefault((offsets[p['seq']] + p['start']) // block, set()).add(shard_i)
+        # Only the blocks that straddle two slices are split
+        self.assertLessEqual(sum(len(s) > 1 for s in owners.values()), len(shards) - 1)
+        # Each shard is a contiguous slice of the shuffled chunks
+        shard_size = len(full) // len(shards)
+        for shard_i, shard in enumerate(shards):
+            np.testing.assert_array_equal(shard, full[shard_i * shard_size : (shard_i + 1) * shard_size])
+
+class OutOfCoreTest(unittest.TestCase):
+    def setUp(self):
+        # Sequences stored one after the other in a memory-mapped file (as in a columnar store),
+        # and downsampled views of them (as with --downsample)
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(0)
+        lengths = [103, 57, 211, 80]
+        self.mmap_2d = np.memmap(os.path.join(self.tmp.name, 'positions_2d'), dtype='float32', mode='w+',
+                                 shape=(sum(lengths), 17, 2))
+        self.mmap_2d[:] = rng.randn(*self.mmap_2d.shape)
+        self.mmap_3d = np.memmap(os.path.join(self.tmp.name, 'positions_3d'), dtype='float32', mode='w+',
+                                 shape=(sum(lengths), 17, 3))
+        self.mmap_3d[:] = rng.randn(*self.mmap_3d.shape)
+        bounds = np.cumsum([0] + lengths)
+        self.poses_2d = [self.mmap_2d[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        self.poses_3d = [self.mmap_3d[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        self.cameras = [rng.randn(9).astype('float32') for _ in lengths]
+        self.kps_left, self.kps_right = [1, 2, 3, 14, 15, 16], [4, 5, 6, 11, 12, 13]
+
+    def tearDown(self):
+        del self.poses_2d, self.poses_3d, self.mmap_2d, self.mmap_3d
+        self.tmp.cleanup()
+
+    def generator(self, poses_2d, poses_3d, out_of_core, **kwargs):
+        return ChunkedGenerator(16, self.cameras, poses_3d, poses_2d, kwargs.pop('chunk_length', 1),
+                                random_seed=42, augment=True, kps_left=self.kps_left, kps_right=self.kps_right,
+                                joints_left=self.kps_left, joints_right=self.kps_right,
+                                out_of_core=out_of_core, **kwargs)
+
+    def assert_same_batches(self, poses_2d, poses_3d, **kwargs):
+        in_memory = self.generator(poses_2d, poses_3d, False, **kwargs)
+        out_of_core = self.generator(poses_2d, poses_3d, True, **kwargs)
+        num_batches = 0
+        for batch, batch_ooc in zip(in_memory.next_epoch(), out_of_core.next_epoch()):
+            for a, b in zip(batch, batch_ooc):
+                np.testing.assert_array_equal(a, b)
+            num_batches += 1
+        self.assertEqual(num_batches, in_memory.num_batches)
+
+    def test_same_batches(self):
+        for kwargs in [{'pad': 13}, {'pad': 13, 'causal_shift': 13}, {'pad': 4, 'chunk_length': 7},
+                       {'pad': 40, 'causal_shift': 40, 'chunk_length': 5, 'shuffle_block': 8}]:
+            with self.subTest(**kwargs):
+                self.assert_same_batches(self.poses_2d, self.poses_3d, **kwargs)
+
+    def test_same_batches_downsampled(self):
+        self.assert_same_batches([seq[1::3] for seq in self.poses_2d], [seq[1::3] for seq in self.poses_3d],
+                                 pad=13, chunk_length=3)
+
+    def test_edge_padding(self):
+        # A window that overflows both ends of a sequence replicates its first/last frame
+        seq = self.poses_2d[1]
+        starts = np.array([-20, seq.shape[0] - 5])
+        window = np.arange(30)
+        batch, _ = ChunkedGenerator._read_windows(self.poses_2d, np.array([1, 1]), starts, window)
+        padded = np.pad(seq, ((20, 25), (0, 0), (0, 0)), 'edge')
+        np.testing.assert_array_equal(batch[0], padded[:30])
+        np.testing.assert_array_equal(batch[1], padded[-30:])
+
+    def test_pages(self):
+        frame_bytes = 17 * 2 * 4
+        # Frames 0-29 of the first sequence, at the start of the (page-aligned) file
+        _, pages = ChunkedGenerator._read_windows(self.poses_2d, np.array([0]), np.array([0]), np.arange(30))
+        self.assertEqual(pages, (30 * frame_bytes - 1) // 4096 + 1)
+        # Frames 0-29 of the third sequence, which starts at frame 160 of the file
+        _, pages = ChunkedGenerator._read_windows(self.poses_2d, np.array([2]), np.array([0]), np.arange(30))
+        self.assertEqual(pages, (190 * frame_bytes - 1) // 4096 - 160 * frame_bytes // 4096 + 1)
+        # Every 31st frame of the file lies on a different page
+        strided = [self.mmap_2d[::31]]
+        _, pages = ChunkedGenerator._read_windows(strided, np.array([0]), np.array([0]), np.arange(10))
+        self.assertEqual(pages, 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.custom_dataset import CustomDataset
+from common.h36m_dataset import Human36mDataset
+from common.h36m_skeleton import h36m_skeleton, h36m_skeleton_17
+
+class H36mSkeletonTest(unittest.TestCase):
+    def assert_same_skeleton(self, a, b):
+        np.testing.assert_array_equal(a.parents(), b.parents())
+        self.assertEqual(list(a.joints_left()), list(b.joints_left()))
+        self.assertEqual(list(a.joints_right()), list(b.joints_right()))
+
+    def test_datasets_use_the_17_joint_skeleton(self):
+        skeleton = h36m_skeleton_17()
+        self.assertEqual(skeleton.num_joints(), 17)
+        self.assertEqual(list(skeleton.joints_left()), [4, 5, 6, 11, 12, 13])
+        self.assertEqual(list(skeleton.joints_right()), [1, 2, 3, 14, 15, 16])
+        self.assertEqual(h36m_skeleton.num_joints(), 32) # Left untouched
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.npz')
+            np.savez_compressed(path, positions_3d={'S1': {'Walking': np.zeros((5, 32, 3), dtype='float32')}},
+                                positions_2d={'video': {'custom': [np.zeros((5, 17, 2), dtype='float32')]}},
+                                metadata={'video_metadata': {'video': {'w': 640, 'h': 480}}})
+            self.assert_same_skeleton(Human36mDataset(path).skeleton(), skeleton)
+            self.assert_same_skeleton(CustomDataset(path).skeleton(), skeleton)
+
+if __name__ == '__main__':
+    unittest.main()
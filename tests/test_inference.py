@@ -0,0 +1,114 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import common.inference
+from common.fusion import fuse_model
+from common.inference import predict_keyframes
+from common.model import TemporalModel, TemporalModelPosTraj
+
+KPS_LEFT, KPS_RIGHT = [1, 3, 5, 7, 9, 11, 13, 15], [2, 4, 6, 8, 10, 12, 14, 16]
+JOINTS_LEFT, JOINTS_RIGHT = [4, 5, 6, 11, 12, 13], [1, 2, 3, 14, 15, 16]
+
+def random_model(num_joints_out, causal, dense=False):
+    model = TemporalModel(17, 2, num_joints_out, [3, 3, 3], causal=causal, channels=32, dense=dense)
+    with torch.no_grad():
+        # Non-trivial batch normalization statistics, so that fusion changes the weights
+        for bn in [model.expand_bn] + list(model.layers_bn):
+            bn.running_mean.uniform_(-0.5, 0.5)
+            bn.running_var.uniform_(0.5, 2)
+    return model.eval()
+
+class PredictKeyframesTest(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.poses_2d = np.random.RandomState(0).randn(150, 17, 2).astype('float32')
+        self.frame_sets = {
+            'clustered': np.arange(40, 70, 2), # Overlapping dependency cones
+            'isolated': np.array([0, 75, 149]), # Disjoint cones, including both sequence ends
+            'unsorted': np.array([120, 3, 64, 3]),
+        }
+
+    def dense_reference(self, model, pad, causal_shift, frames, augment, swap_joints):
+        padded = np.pad(self.poses_2d, ((pad + causal_shift, pad - causal_shift), (0, 0), (0, 0)), 'edge')
+        inputs = torch.from_numpy(padded[None])
+        with torch.no_grad():
+            outputs = model(inputs)[0].numpy()
+            if augment:
+                flipped = inputs.clone()
+                flipped[:, :, :, 0] *= -1
+                flipped[:, :, KPS_LEFT + KPS_RIGHT] = flipped[:, :, KPS_RIGHT + KPS_LEFT]
+                outputs_flipped = model(flipped)[0].numpy()
+                outputs_flipped[:, :, 0] *= -1
+                if swap_joints:
+                    outputs_flipped[:, JOINTS_LEFT + JOINTS_RIGHT] = outputs_flipped[:, JOINTS_RIGHT + JOINTS_LEFT]
+                outputs = (outputs + outputs_flipped) / 2
+        return outputs[frames]
+
+    def check(self, model, causal, swap_joints=True):
+        pad = 13 # Receptive field of 27 frames
+        causal_shift = pad if causal else 0
+        for name, frames in self.frame_sets.items():
+            for augment in [False, True]:
+                with self.subTest(frames=name, augment=augment):
+                    expected = self.dense_reference(model, pad, causal_shift, frames, augment, swap_joints)
+                    joints = (JOINTS_LEFT, JOINTS_RIGHT) if swap_joints else (None, None)
+                    with mock.patch.object(common.inference, '_sparse_forward',
+                                           wraps=common.inference._sparse_forward) as sparse_forward:
+                        # max_density=1 always takes the sparse path, max_density=0 never
+                        sparse = predict_keyframes(model, self.poses_2d, frames, pad, causal_shift, augment=augment,
+                                                   kps_left=KPS_LEFT, kps_right=KPS_RIGHT, joints_left=joints[0],
+                                                   joints_right=joints[1], max_density=1)
+                        self.assertTrue(sparse_forward.called)
+                    dense = predict_keyframes(model, self.poses_2d, frames, pad, causal_shift, augment=augment,
+                                              kps_left=KPS_LEFT, kps_right=KPS_RIGHT, joints_left=joints[0],
+                                              joints_right=joints[1], max_density=0)
+                    self.assertEqual(sparse.shape, expected.shape)
+                    np.testing.assert_allclose(sparse, expected, rtol=1e-4, atol=1e-5)
+                    np.testing.assert_allclose(dense, expected, rtol=1e-4, atol=1e-5)
+
+    def test_model(self):
+        for causal in [False, True]:
+            with self.subTest(causal=causal):
+                self.check(random_model(17, causal), causal)
+
+    def test_dense_convolutions(self):
+        self.check(random_model(17, False, dense=True), False)
+
+    def test_fused_model(self):
+        for causal in [False, True]:
+            with self.subTest(causal=causal):
+                self.check(fuse_model(random_model(17, causal)), causal)
+
+    def test_trajectory_model(self):
+        self.check(random_model(1, False), False, swap_joints=False)
+
+    def test_pos_traj_model(self):
+        for causal in [False, True]:
+            for fused in [False, True]:
+                with self.subTest(causal=causal, fused=fused):
+                    model_pos = random_model(17, causal)
+                    model_traj = random_model(1, causal)
+                    if fused:
+                        model_pos, model_traj = fuse_model(model_pos), fuse_model(model_traj)
+                    self.check(TemporalModelPosTraj(model_pos, model_traj), causal)
+
+    def test_empty(self):
+        model = random_model(17, False)
+        self.assertEqual(predict_keyframes(model, self.poses_2d, [], 13, 0).shape, (0, 17, 3))
+        self.assertEqual(predict_keyframes(model, self.poses_2d[:0], [], 13, 0).shape, (0, 17, 3))
+
+if __name__ == '__main__':
+    unittest.main()
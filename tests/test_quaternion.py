@@ -0,0 +1,73 @@
+# Copyright (c) 2018-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.quaternion import qinverse, qrot
+from common.utils import wrap
+
+class QuaternionTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        q = rng.randn(10, 17, 4)
+        self.q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+        self.v = rng.randn(10, 17, 3)
+
+    def test_qrot(self):
+        for dtype in ['float32', 'float64']:
+            with self.subTest(dtype=dtype):
+                q, v = self.q.astype(dtype), self.v.astype(dtype)
+                result = qrot(q, v)
+                self.assertIsInstance(result, np.ndarray)
+                self.assertEqual(result.dtype, np.dtype(dtype))
+                expected = qrot(torch.from_numpy(q), torch.from_numpy(v)).numpy()
+                np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-6)
+                # Rotations preserve the norm
+                np.testing.assert_allclose(np.linalg.norm(result, axis=-1), np.linalg.norm(v, axis=-1), rtol=1e-5)
+
+    def test_qinverse(self):
+        result = qinverse(self.q)
+        self.assertIsInstance(result, np.ndarray)
+        np.testing.assert_array_equal(result, qinverse(torch.from_numpy(self.q)).numpy())
+        # Rotating back and forth is the identity
+        np.testing.assert_allclose(qrot(result, qrot(self.q, self.v)), self.v, atol=1e-12)
+        q = self.q.copy()
+        self.assertIs(qinverse(q, inplace=True), q)
+        np.testing.assert_array_equal(q, result)
+
+class WrapTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.q = rng.randn(5, 4)
+        self.v = rng.randn(5, 3)
+
+    def test_tensors_are_returned_unchanged(self):
+        q, v = torch.from_numpy(self.q), torch.from_numpy(self.v)
+        result = wrap(qrot, q, v)
+        self.assertIsInstance(result, torch.Tensor)
+        torch.testing.assert_close(result, qrot(q, v))
+        tensor = torch.zeros(3)
+        self.assertIs(wrap(lambda x: x, tensor), tensor)
+
+    def test_arrays_are_converted(self):
+        result = wrap(qrot, self.q, self.v)
+        self.assertIsInstance(result, np.ndarray)
+        np.testing.assert_allclose(result, qrot(self.q, self.v), atol=1e-12)
+        # Outputs share the memory of the inputs
+        array = np.zeros(3)
+        self.assertTrue(np.shares_memory(wrap(lambda x: x, array), array))
+        result = wrap(qinverse, self.q[0], unsqueeze=True)
+        self.assertEqual(result.shape, (4,))
+
+if __name__ == '__main__':
+    unittest.main()